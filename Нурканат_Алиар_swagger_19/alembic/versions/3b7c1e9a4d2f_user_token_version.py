@@ -0,0 +1,28 @@
+"""user token_version
+
+Revision ID: 3b7c1e9a4d2f
+Revises: 5860d4f9027a
+Create Date: 2026-10-17 10:12:41.208517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c1e9a4d2f'
+down_revision: Union[str, Sequence[str], None] = '5860d4f9027a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user', 'token_version')
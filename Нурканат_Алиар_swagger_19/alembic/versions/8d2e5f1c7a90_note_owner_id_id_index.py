@@ -0,0 +1,28 @@
+"""note owner_id, id index
+
+Revision ID: 8d2e5f1c7a90
+Revises: 3b7c1e9a4d2f
+Create Date: 2026-10-17 11:03:52.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5f1c7a90'
+down_revision: Union[str, Sequence[str], None] = '3b7c1e9a4d2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_note_owner_id_id', 'note', ['owner_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_note_owner_id_id', table_name='note')
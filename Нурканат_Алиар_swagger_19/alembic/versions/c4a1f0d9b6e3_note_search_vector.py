@@ -0,0 +1,40 @@
+"""note search_vector
+
+Revision ID: c4a1f0d9b6e3
+Revises: 8d2e5f1c7a90
+Create Date: 2026-10-17 11:47:09.316254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a1f0d9b6e3'
+down_revision: Union[str, Sequence[str], None] = '8d2e5f1c7a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Заголовок весит больше содержимого при ранжировании (ts_rank).
+    # То же выражение объявлено в models.note_search_vector для create_all
+    op.execute(
+        """
+        ALTER TABLE note ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+        ) STORED
+        """
+    )
+    op.create_index('ix_note_search_vector', 'note', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_note_search_vector', table_name='note', postgresql_using='gin')
+    op.drop_column('note', 'search_vector')
@@ -0,0 +1,28 @@
+"""note version
+
+Revision ID: e7f3a2b8c5d1
+Revises: c4a1f0d9b6e3
+Create Date: 2026-10-17 13:21:36.548802
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7f3a2b8c5d1'
+down_revision: Union[str, Sequence[str], None] = 'c4a1f0d9b6e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('note', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('note', 'version')
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Optional
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+
+ADMISSION_LIMIT = Gauge("admission_concurrency_limit", "Current adaptive limit of concurrent requests")
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight_requests", "Requests currently being processed")
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests shed with 503 by the admission controller")
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Smoothed event loop scheduling delay")
+
+
+class AdaptiveLimit:
+    """
+    Адаптивный лимит одновременных запросов (AIMD): растет на единицу,
+    пока лимит используется и сервис здоров, и уменьшается в разы при
+    росте задержки цикла событий или времени ответа. Фоновый монитор
+    запускается и останавливается в lifespan приложения.
+    """
+
+    def __init__(self):
+        self.min_limit = settings.ADMISSION_MIN_LIMIT
+        self.max_limit = settings.ADMISSION_MAX_LIMIT
+        self.limit = float(settings.ADMISSION_INITIAL_LIMIT)
+        self.target_latency = settings.ADMISSION_TARGET_LATENCY
+        self.max_loop_lag = settings.ADMISSION_MAX_LOOP_LAG
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self._peak_in_flight = 0
+        self._peak_loop_lag = 0.0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._monitor: Optional[asyncio.Task] = None
+        ADMISSION_LIMIT.set(self.limit)
+
+    async def start(self):
+        self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+    async def _monitor_loop(self):
+        interval = 0.1
+        ticks_per_adjust = max(1, round(settings.ADMISSION_ADJUST_INTERVAL / interval))
+        tick = 0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            # Насколько позже запланированного нас разбудили - задержка цикла событий
+            lag = max(0.0, time.perf_counter() - start - interval)
+            self.loop_lag = 0.8 * self.loop_lag + 0.2 * lag
+            self._peak_loop_lag = max(self._peak_loop_lag, lag)
+            EVENT_LOOP_LAG.set(self.loop_lag)
+            tick += 1
+            if tick % ticks_per_adjust == 0:
+                self._adjust()
+
+    def _adjust(self):
+        avg_latency = self._latency_sum / self._latency_count if self._latency_count else 0.0
+        # Решение по худшей задержке за интервал: одна долгая блокировка цикла уже признак перегрузки
+        if self._peak_loop_lag > self.max_loop_lag or avg_latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        elif self._peak_in_flight >= 0.8 * self.limit:
+            # Расти имеет смысл только когда текущий лимит действительно выбирается
+            self.limit = min(self.max_limit, self.limit + 1)
+        self._peak_in_flight = self.in_flight
+        self._peak_loop_lag = 0.0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        ADMISSION_LIMIT.set(self.limit)
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self.in_flight)
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        return True
+
+    def release(self, latency: Optional[float]):
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        if latency is not None:
+            self._latency_sum += latency
+            self._latency_count += 1
+
+
+class AdmissionController:
+    """
+    Сверх адаптивного лимита - быстрый 503 вместо очереди,
+    в которой запросы истекают по таймауту
+    """
+
+    def __init__(self, app: ASGIApp, limit: Optional[AdaptiveLimit] = None,
+                 exempt_paths: tuple[str, ...] = ("/health", "/metrics")):
+        self.app = app
+        self.limit = limit or admission_limit
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.limit.try_acquire():
+            ADMISSION_REJECTED.inc()
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Service is overloaded. Try again later."},
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        latency = None
+
+        async def send_with_timing(message: Message):
+            nonlocal latency
+            # Время до начала ответа: долгий стриминг (экспорт) не считается перегрузкой
+            if message["type"] == "http.response.start" and latency is None:
+                latency = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.limit.release(latency)
+
+
+admission_limit = AdaptiveLimit()
@@ -0,0 +1,140 @@
+import json
+import pickle
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class JsonCodec:
+    name = "json"
+    # JSON-кодекам нужны данные после jsonable_encoder, а не ORM-объекты
+    json_only = True
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    json_only = True
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("orjson is not installed")
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    json_only = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class PickleCodec:
+    """Сохраняет произвольные объекты, но загрузка из Redis исполняет код: только для доверенного Redis"""
+    name = "pickle"
+    json_only = False
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=5)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+CODECS = {
+    "json": JsonCodec,
+    "orjson": OrjsonCodec,
+    "msgpack": MsgpackCodec,
+    "pickle": PickleCodec,
+}
+
+# Каждое значение начинается с байта-маркера, чтобы сжатие можно было
+# включать и выключать без сброса уже записанных данных
+RAW = b"\x00"
+ZSTD = b"\x01"
+LZ4 = b"\x02"
+
+
+class CacheSerializer:
+    def __init__(self, codec: str = "json", compression: str = "none", compress_min_bytes: int = 1024):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown cache codec: {codec}")
+        self.codec = CODECS[codec]()
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._zstd_compressor: Optional[Any] = None
+        self._zstd_decompressor: Optional[Any] = None
+
+        if compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is not installed")
+            self._zstd_compressor = zstandard.ZstdCompressor(level=3)
+        elif compression == "lz4":
+            if lz4_frame is None:
+                raise RuntimeError("lz4 is not installed")
+        elif compression != "none":
+            raise ValueError(f"Unknown cache compression: {compression}")
+
+    @property
+    def json_only(self) -> bool:
+        return self.codec.json_only
+
+    def dumps(self, value: Any) -> bytes:
+        data = self.codec.dumps(value)
+        if len(data) < self.compress_min_bytes or self.compression == "none":
+            return RAW + data
+        if self.compression == "zstd":
+            return ZSTD + self._zstd_compressor.compress(data)
+        return LZ4 + lz4_frame.compress(data)
+
+    def loads(self, data: bytes) -> Any:
+        marker, payload = data[:1], data[1:]
+        if marker == ZSTD:
+            if self._zstd_decompressor is None:
+                if zstandard is None:
+                    raise RuntimeError("zstandard is not installed")
+                self._zstd_decompressor = zstandard.ZstdDecompressor()
+            payload = self._zstd_decompressor.decompress(payload)
+        elif marker == LZ4:
+            if lz4_frame is None:
+                raise RuntimeError("lz4 is not installed")
+            payload = lz4_frame.decompress(payload)
+        elif marker != RAW:
+            raise ValueError("Unknown cache value format")
+        return self.codec.loads(payload)
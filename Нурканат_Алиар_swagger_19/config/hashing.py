@@ -0,0 +1,58 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from fastapi import HTTPException, status
+from prometheus_client import Gauge, Histogram
+from config.settings import settings
+
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hashing jobs queued or running in the hashing pool"
+)
+HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds",
+    "Time from admission to completion of a password hash/verify job",
+    ["operation"]
+)
+
+
+class HashingExecutor:
+    def __init__(self, pool_size: int = 2, queue_size: int = 16):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+        return self._executor
+
+    async def run(self, operation: str, func: Callable, *args) -> Any:
+        # Reject instead of queueing forever so login storms degrade into fast 503s
+        if self._pending >= self.pool_size + self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy. Try again later.",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        HASH_QUEUE_DEPTH.set(self._pending)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+            HASH_QUEUE_DEPTH.set(self._pending)
+            HASH_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = HashingExecutor(pool_size=settings.HASH_POOL_SIZE, queue_size=settings.HASH_QUEUE_SIZE)
@@ -1,50 +1,406 @@
-from fastapi import Request, HTTPException
+from fastapi import Request
 from fastapi.responses import JSONResponse
 from redis.asyncio import Redis, from_url
-from config.settings import settings
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings, RateLimitPolicy
+from config.token_cache import bearer_token, token_principal
+import logging
+import math
+import re
 import time
-from starlette.middleware.base import BaseHTTPMiddleware
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
 
-class RateLimiterMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
+logger = logging.getLogger(__name__)
+
+# GCRA: each key stores the theoretical arrival time (TAT) in milliseconds.
+# The whole check-and-update runs in Redis, so concurrent requests cannot
+# all read the same state and slip through together. Several buckets (one per
+# matching policy) are checked first and updated only if all of them allow.
+# ARGV: partial, then limit, period (s), cost for every key. With partial=1
+# up to `cost` tokens are granted (used to lease quota in chunks), otherwise
+# all or nothing.
+# Returns {granted, remaining, retry_after_ms, reset_ms, tightest_key_index}.
+GCRA_SCRIPT = """
+local partial = tonumber(ARGV[1]) == 1
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local new_tats = {}
+local granted = nil
+local remaining, reset, tightest = nil, 0, 1
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[3 * i - 1])
+    local period = tonumber(ARGV[3 * i]) * 1000
+    -- A request heavier than the whole bucket takes all of it rather than never passing
+    local cost = math.min(tonumber(ARGV[3 * i + 1]), limit)
+    local interval = period / limit
+
+    local tat = tonumber(redis.call('GET', key) or now)
+    if tat < now then
+        tat = now
+    end
+
+    local available = math.floor((now + period - tat) / interval)
+    local take = cost
+    if available < cost then
+        if not partial or available < 1 then
+            local allow_at = tat + interval * cost - period
+            return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now), i}
+        end
+        take = available
+    end
+    if granted == nil or take < granted then
+        granted = take
+    end
+    new_tats[i] = {tat, interval}
+    if remaining == nil or available - take < remaining then
+        remaining = available - take
+        tightest = i
+    end
+end
+
+for i, key in ipairs(KEYS) do
+    local new_tat = new_tats[i][1] + new_tats[i][2] * granted
+    redis.call('SET', key, new_tat, 'PX', math.max(1, math.ceil(new_tat - now)))
+    if i == tightest then
+        reset = math.ceil(new_tat - now)
+    end
+end
+return {granted, remaining, 0, reset, tightest}
+"""
+
+# Returns unused leased tokens: moves the TAT back by their worth, but never
+# before now, so a bucket that has refilled in the meantime gains nothing.
+# ARGV: limit, period (s), tokens.
+GCRA_REFUND_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if tat == nil then
+    return 0
+end
+local new_tat = tat - tonumber(ARGV[2]) * 1000 / tonumber(ARGV[1]) * tonumber(ARGV[3])
+if new_tat <= now then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+end
+return 1
+"""
+
+
+@dataclass
+class Bucket:
+    key: str
+    limit: int
+    window: int
+    cost: int
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after_ms: int
+    reset_ms: int
+
+
+@dataclass
+class Lease:
+    tokens: int
+    remaining: int
+    expires_at: float
+    reset_at: float
+    limit: int
+    window: int
+
+
+class LeaseCache:
+    """
+    Квоты, выданные воркеру из Redis пачками: пока в аренде есть токены,
+    запросы клиента проверяются в памяти без обращения к Redis
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._leases: "OrderedDict[str, Lease]" = OrderedDict()
+
+    def take(self, key: str, cost: int = 1) -> Optional[Lease]:
+        lease = self._leases.get(key)
+        if lease is None or lease.expires_at <= time.monotonic() or lease.tokens < cost:
+            return None
+        lease.tokens -= cost
+        self._leases.move_to_end(key)
+        return lease
+
+    def pop_expired(self, key: str) -> Optional[Lease]:
+        """Снимает истекшую аренду: ее неиспользованные токены нужно вернуть в Redis"""
+        lease = self._leases.get(key)
+        if lease is None or lease.expires_at > time.monotonic():
+            return None
+        del self._leases[key]
+        return lease
+
+    def give_back(self, key: str, tokens: int) -> bool:
+        """Возвращает токены в аренду, если она еще в кэше"""
+        lease = self._leases.get(key)
+        if lease is None:
+            return False
+        lease.tokens += tokens
+        return True
+
+    def held(self, key: str) -> int:
+        """Токены, еще оставшиеся в действующей аренде"""
+        lease = self._leases.get(key)
+        if lease is None or lease.expires_at <= time.monotonic():
+            return 0
+        return lease.tokens
+
+    def put(self, key: str, lease: Lease) -> list[tuple[str, Lease]]:
+        """Сохраняет аренду и возвращает вытесненные, чтобы вернуть их токены"""
+        self._leases[key] = lease
+        self._leases.move_to_end(key)
+        evicted = []
+        while len(self._leases) > self.maxsize:
+            evicted.append(self._leases.popitem(last=False))
+        return evicted
+
+
+class CompiledPolicy:
+    def __init__(self, policy: RateLimitPolicy):
+        self.name = policy.name
+        self.path = re.compile(policy.path)
+        self.methods = {method.upper() for method in policy.methods}
+        self.roles = set(policy.roles)
+        self.key = policy.key
+        self.limit = policy.limit
+        self.window = policy.window
+        self.costs = [(re.compile(pattern), cost) for pattern, cost in policy.costs.items()]
+
+    def matches(self, method: str, path: str, principal: Optional[dict]) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        if self.roles and (principal is None or principal["role"] not in self.roles):
+            return False
+        return self.path.fullmatch(path) is not None
+
+    def cost(self, path: str) -> int:
+        for pattern, cost in self.costs:
+            if pattern.fullmatch(path):
+                return cost
+        return 1
+
+    def bucket_key(self, client_ip: str, principal: Optional[dict]) -> str:
+        # Для анонимных запросов ключи sub и role сводятся к IP
+        if self.key == "sub" and principal is not None:
+            return f"rate_limit:{self.name}:sub:{principal['sub']}"
+        if self.key == "role" and principal is not None:
+            return f"rate_limit:{self.name}:role:{principal['role']}"
+        return f"rate_limit:{self.name}:ip:{client_ip}"
+
+
+class RateLimiterMiddleware:
+    def __init__(self, app: ASGIApp, policies: Optional[list[RateLimitPolicy]] = None):
+        self.app = app
         self.redis = None
+        self.script = None
+        self.refund_script = None
+        self.leases = LeaseCache() if settings.RATE_LIMIT_MODE == "hybrid" else None
+        self.policies = [CompiledPolicy(policy) for policy in (policies or settings.RATE_LIMIT_POLICIES)]
+        self.needs_principal = any(policy.key != "ip" or policy.roles for policy in self.policies)
 
     async def get_redis(self):
         if self.redis is None:
             self.redis = from_url(str(settings.REDIS_URL), max_connections=settings.REDIS_POOL_SIZE)
+            self.script = self.redis.register_script(GCRA_SCRIPT)
+            self.refund_script = self.redis.register_script(GCRA_REFUND_SCRIPT)
         return self.redis
 
-    async def dispatch(self, request: Request, call_next):
+    def rate_limit_headers(self, decision: Decision) -> dict:
+        return {
+            "X-RateLimit-Limit": str(decision.limit),
+            "X-RateLimit-Remaining": str(max(decision.remaining, 0)),
+            "X-RateLimit-Reset": str(math.ceil(decision.reset_ms / 1000)),
+        }
+
+    def buckets(self, scope: Scope) -> list[Bucket]:
+        method, path = scope["method"], scope["path"]
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        principal = None
+        if self.needs_principal:
+            token = bearer_token(scope)
+            principal = token_principal(token) if token else None
+        return [
+            Bucket(policy.bucket_key(client_ip, principal), policy.limit, policy.window, policy.cost(path))
+            for policy in self.policies
+            if policy.matches(method, path, principal)
+        ]
+
+    async def acquire(self, buckets: list[Bucket]) -> Decision:
+        if self.leases is not None:
+            decisions = []
+            for bucket in buckets:
+                decision = await self.acquire_leased(bucket)
+                if not decision.allowed:
+                    # Все или ничего: токены, уже списанные в предыдущих корзинах, возвращаются
+                    for taken in buckets[:len(decisions)]:
+                        await self.release(taken)
+                    return decision
+                decisions.append(decision)
+            return min(decisions, key=lambda decision: decision.remaining)
+
+        await self.get_redis()
+        # Один вызов Lua-скрипта (EVALSHA) на запрос, сколько бы политик ни совпало
+        args = [0]
+        for bucket in buckets:
+            args += [bucket.limit, bucket.window, bucket.cost]
+        granted, remaining, retry_after_ms, reset_ms, tightest = await self.script(
+            keys=[bucket.key for bucket in buckets],
+            args=args
+        )
+        return Decision(
+            allowed=bool(granted),
+            limit=buckets[int(tightest) - 1].limit,
+            remaining=int(remaining),
+            retry_after_ms=int(retry_after_ms),
+            reset_ms=int(reset_ms)
+        )
+
+    async def acquire_leased(self, bucket: Bucket) -> Decision:
+        # Как и в скрипте: запрос дороже всего лимита забирает весь лимит
+        cost = min(bucket.cost, bucket.limit)
+        lease = self.leases.take(bucket.key, cost)
+        if lease is not None:
+            reset_ms = max(0, int((lease.reset_at - time.monotonic()) * 1000))
+            return Decision(True, bucket.limit, lease.remaining + lease.tokens, 0, reset_ms)
+
+        # Неиспользованные токены истекшей аренды возвращаются в Redis,
+        # иначе редкий клиент терял бы почти всю пачку на каждом запросе
+        expired = self.leases.pop_expired(bucket.key)
+        if expired is not None:
+            await self.refund(bucket.key, expired)
+
+        # Арендуем сразу пачку токенов; пока аренда жива, они недоступны другим воркерам,
+        # поэтому пачка не больше 10% лимита
+        lease_size = min(settings.RATE_LIMIT_LEASE_SIZE, max(1, bucket.limit // 10))
+        # Остаток аренды, которого не хватило на дорогой запрос, не сгорает, а добирается
+        held = self.leases.held(bucket.key)
+        await self.get_redis()
+        granted, remaining, retry_after_ms, reset_ms, _ = await self.script(
+            keys=[bucket.key],
+            args=[1, bucket.limit, bucket.window, max(lease_size, cost) - held]
+        )
+        granted, remaining, reset_ms = int(granted), int(remaining), int(reset_ms)
+        if not granted:
+            return Decision(False, bucket.limit, 0, int(retry_after_ms), reset_ms)
+
+        now = time.monotonic()
+        granted += held
+        allowed = granted >= cost
+        evicted = self.leases.put(bucket.key, Lease(
+            tokens=granted - cost if allowed else granted,
+            remaining=remaining,
+            expires_at=now + settings.RATE_LIMIT_LEASE_TTL,
+            reset_at=now + reset_ms / 1000,
+            limit=bucket.limit,
+            window=bucket.window
+        ))
+        for key, lease in evicted:
+            await self.refund(key, lease)
+        if not allowed:
+            # Выданного не хватает на дорогой запрос: копим аренду до следующей попытки
+            retry_after_ms = math.ceil((cost - granted) * bucket.window * 1000 / bucket.limit)
+            return Decision(False, bucket.limit, 0, retry_after_ms, reset_ms)
+        return Decision(True, bucket.limit, remaining + granted - cost, 0, reset_ms)
+
+    async def refund(self, key: str, lease: Lease):
+        if lease.tokens > 0:
+            await self.get_redis()
+            await self.refund_script(keys=[key], args=[lease.limit, lease.window, lease.tokens])
+
+    async def release(self, bucket: Bucket):
+        """Отменяет списание запроса, уже одобренного по этой корзине"""
+        cost = min(bucket.cost, bucket.limit)
+        if not self.leases.give_back(bucket.key, cost):
+            await self.refund(bucket.key, Lease(cost, 0, 0, 0, bucket.limit, bucket.window))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Only the limiter itself is guarded: an error raised by the app must not run it again
         try:
-            redis = await self.get_redis()
-            client_ip = request.client.host
-            current_time = int(time.time())
-            key = f"rate_limit:{client_ip}"
-
-            data = await redis.hgetall(key)
-            if not data:
-                await redis.hset(key, mapping={"count": 1, "timestamp": current_time})
-                await redis.expire(key, settings.RATE_LIMIT_WINDOW)
-                return await call_next(request)
-
-            count = int(data.get("count", 0))
-            timestamp = int(data.get("timestamp", 0))
-
-            if current_time - timestamp > settings.RATE_LIMIT_WINDOW:
-                await redis.hset(key, mapping={"count": 1, "timestamp": current_time})
-                return await call_next(request)
-
-            if count >= settings.RATE_LIMIT_REQUESTS:
-                return JSONResponse(
-                    status_code=429,
-                    content={"detail": "Rate limit exceeded. Try again later."}
-                )
-
-            await redis.hincrby(key, "count", 1)
-            
-            return await call_next(request)
+            buckets = self.buckets(scope)
+            decision = await self.acquire(buckets) if buckets else None
         except Exception as e:
             # If Redis is unavailable, allow the request to proceed without rate limiting
-            print(f"Redis error in rate limiter: {e}")
-            return await call_next(request)
\ No newline at end of file
+            logger.warning({"event": "rate_limiter_unavailable", "error": str(e)})
+            decision = None
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = self.rate_limit_headers(decision)
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after_ms / 1000)))
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded. Try again later."},
+                headers=headers
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestLoggingMiddleware:
+    """Логирует запрос и код ответа, не буферизуя тело (стриминг не ломается)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def refund(self, key: str, lease: Lease):
+        if lease.tokens > 0:
+            await self.get_redis()
+            await self.refund_script(keys=[key], args=[lease.limit, lease.window, lease.tokens])
+
+    async def release(self, bucket: Bucket):
+        """Отменяет списание запроса, уже одобренного по этой корзине"""
+        cost = min(bucket.cost, bucket.limit)
+        if not self.leases.give_back(bucket.key, cost):
+            await self.refund(bucket.key, Lease(cost, 0, 0, 0, bucket.limit, bucket.window))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        logger.info({
+            "event": "request",
+            "method": request.method,
+            "url": str(request.url)
+        })
+
+        async def send_with_logging(message: Message):
+            if message["type"] == "http.response.start":
+                logger.info({
+                    "event": "response",
+                    "status_code": message["status"]
+                })
+            await send(message)
+
+        await self.app(scope, receive, send_with_logging)
@@ -1,52 +1,568 @@
 from redis.asyncio import Redis, from_url
-from fastapi import Request, Response
+from fastapi import Request, Response, BackgroundTasks, WebSocket
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
 from functools import wraps
-import pickle
+from contextlib import asynccontextmanager
+from prometheus_client import Counter, Histogram
+import asyncio
+import logging
 import json
-from typing import Optional, Callable, Any
+import math
+import random
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional, Callable, Any, Iterable, Sequence
 import hashlib
+from config.settings import settings
+from config.cache_codecs import CacheSerializer
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+LOCK_POLL_INTERVAL = 0.05
+
+STALE_AGE_HEADER = "X-Cache-Stale-Age"
+
+CACHE_HITS = Counter(
+    "cache_hits_total",
+    "Cache lookups answered from the cache",
+    ["key_prefix", "tier"]
+)
+CACHE_MISSES = Counter(
+    "cache_misses_total",
+    "Cache lookups that found no entry",
+    ["key_prefix"]
+)
+CACHE_ERRORS = Counter(
+    "cache_errors_total",
+    "Redis errors while reading or writing the cache",
+    ["key_prefix", "operation"]
+)
+CACHE_STAMPEDE_WAITS = Counter(
+    "cache_stampede_waits_total",
+    "Requests that waited for another request or worker to recompute an entry",
+    ["key_prefix", "scope"]
+)
+CACHE_LOOKUP_LATENCY = Histogram(
+    "cache_lookup_duration_seconds",
+    "Time to look up an entry in L1 and Redis",
+    ["key_prefix"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+CACHE_COMPUTE_LATENCY = Histogram(
+    "cache_compute_duration_seconds",
+    "Time to compute a value on a cache miss",
+    ["key_prefix"]
+)
+CACHE_STALE_AGE = Histogram(
+    "cache_stale_age_seconds",
+    "Age past freshness of cache entries served in stale-while-revalidate mode",
+    ["key_prefix"]
+)
+
+# Injected per-request objects that say nothing about the cached result
+SKIPPED_ARG_TYPES = (AsyncSession, Request, Response, WebSocket, BackgroundTasks)
+
+
+def _canonical_arg(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_canonical_arg(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _canonical_arg(item) for key, item in value.items()}
+    # ORM-объекты (например, current_user) идентифицируются своим первичным ключом
+    if hasattr(value, "id"):
+        return {"id": value.id}
+    return str(value)
+
+
+def default_key_builder(func: Callable, kwargs: dict) -> str:
+    """Ключ из значимых аргументов вызова: зависимости вроде сессии и запроса пропускаются"""
+    relevant = {
+        name: _canonical_arg(value)
+        for name, value in kwargs.items()
+        if not isinstance(value, SKIPPED_ARG_TYPES)
+    }
+    payload = json.dumps(relevant, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _should_refresh_early(entry: tuple, beta: float) -> bool:
+    """XFetch: чем дороже пересчет и ближе истечение, тем выше шанс обновить заранее"""
+    if beta <= 0:
+        return False
+    delta, expires_at = entry[2], entry[3]
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def _without_conditional_headers(request: Request) -> Request:
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (name, value) for name, value in request.scope["headers"]
+        if name not in (b"if-none-match", b"if-modified-since")
+    ]
+    return Request(scope)
+
+
+@asynccontextmanager
+async def _detached_kwargs(kwargs: dict):
+    """
+    Аргументы для фонового пересчета: к этому моменту ответ уже отправлен,
+    а сессия запроса закрыта, поэтому сессия и Response создаются заново
+    """
+    sessions = []
+    detached = {}
+    for name, value in kwargs.items():
+        if isinstance(value, AsyncSession):
+            value = type(value)(bind=value.bind, expire_on_commit=False, autoflush=False)
+            sessions.append(value)
+        elif isinstance(value, Response):
+            value = Response()
+            del value.headers["content-length"]
+        elif isinstance(value, Request):
+            value = _without_conditional_headers(value)
+        detached[name] = value
+    try:
+        yield detached
+    finally:
+        for session in sessions:
+            await session.close()
+
+
+def _find_arg(kwargs: dict, arg_type: type) -> Any:
+    for value in kwargs.values():
+        if isinstance(value, arg_type):
+            return value
+    return None
+
+
+def _etag_matches(request: Optional[Request], etag: Optional[str]) -> bool:
+    if request is None or not etag:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+# Drops every entry registered under the given tag sets together with the sets
+# themselves, atomically, so a concurrent write cannot slip in between.
+# KEYS[1..ARGV[1]] are the tag sets to drop; the remaining KEYS are the key_prefix
+# sets, which are never dropped as a whole and would otherwise keep every removed key
+INVALIDATE_TAGS_SCRIPT = """
+local tag_count = tonumber(ARGV[1])
+local removed = 0
+for t = 1, tag_count do
+    local members = redis.call('SMEMBERS', KEYS[t])
+    for i = 1, #members, 500 do
+        local chunk = {unpack(members, i, math.min(i + 499, #members))}
+        removed = removed + redis.call('UNLINK', unpack(chunk))
+        for p = tag_count + 1, #KEYS do
+            redis.call('SREM', KEYS[p], unpack(chunk))
+        end
+    end
+    redis.call('UNLINK', KEYS[t])
+end
+return removed
+"""
+
+
+class LocalCache:
+    """Ограниченный по размеру LRU-кэш с TTL внутри процесса"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, Any, tuple[str, ...]]]" = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Sequence[str] = ()):
+        if self.maxsize <= 0:
+            return
+        # L1 never outlives the Redis entry it mirrors
+        ttl = self.ttl if ttl is None else min(self.ttl, ttl)
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key)
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, set()):
+                self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
 
 class RedisCache:
-    def __init__(self):
+    def __init__(self, l1_size: int = 0, l1_ttl: float = 5.0, channel: str = "cache:invalidate",
+                 tag_prefix: str = "cache:tag", serializer: Optional[CacheSerializer] = None):
         self.redis: Optional[Redis] = None
+        self.serializer = serializer or CacheSerializer()
+        self.local = LocalCache(maxsize=l1_size, ttl=l1_ttl) if l1_size > 0 else None
+        self.channel = channel
+        self.tag_prefix = tag_prefix
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: set[str] = set()
+        self._background: set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+        # key_prefix всех закэшированных функций: их наборы чистятся при сбросе тегов
+        self._prefixes: set[str] = set()
 
     async def init_redis(self, url: str):
         self.redis = from_url(url)
+        if self.local is not None:
+            self._listener = asyncio.create_task(self._listen_invalidations())
         return self
 
     async def close(self):
+        for task in list(self._background):
+            task.cancel()
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
         if self.redis:
             await self.redis.close()
 
-    def cache(self, key_prefix: str = "", ttl: int = 300):
+    async def _listen_invalidations(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Invalidations published while we were not subscribed are lost
+                    self.local.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        self.local.invalidate_tags(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning({"event": "cache_invalidation_listener_failed", "error": str(e)})
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.tag_prefix}:{tag}"
+
+    def cache(self, key_prefix: str = "", ttl: int = 300, tags: Sequence[str] = (),
+              key_builder: Callable[[Callable, dict], str] = default_key_builder,
+              lock_ttl: float = 5.0, early_refresh_beta: float = 0.0, stale_ttl: int = 0):
+        """
+        Кэширует результат функции в Redis.
+
+        tags - шаблоны тегов, подставляются из аргументов вызова,
+        например "user:{current_user.id}:notes". Каждая запись также
+        помечается тегом key_prefix, поэтому invalidate(key_prefix)
+        работает без обхода всего keyspace.
+
+        Для эндпоинтов вместе с результатом сохраняются заголовки,
+        выставленные на внедренном Response (ETag, X-Next-Cursor),
+        а If-None-Match проверяется по сохраненному ETag.
+        Ответы-объекты Response (например, 304) не кэшируются.
+
+        Промах пересчитывается один раз: внутри процесса остальные
+        запросы ждут общий future, между процессами - Redis-блокировку
+        на lock_ttl секунд. early_refresh_beta > 0 включает вероятностное
+        досрочное обновление (XFetch) незадолго до истечения TTL.
+
+        stale_ttl > 0 включает stale-while-revalidate: еще stale_ttl секунд
+        после истечения ttl запись отдается сразу (с заголовком
+        X-Cache-Stale-Age), а пересчет идет в фоне.
+        """
         def decorator(func: Callable):
+            self._prefixes.add(key_prefix)
+
             @wraps(func)
             async def wrapper(*args, **kwargs):
                 if not self.redis:
                     raise RuntimeError("Redis not initialized")
-                
-                cache_key = f"{key_prefix}:{func.__name__}:{hashlib.md5(json.dumps(kwargs).encode()).hexdigest()}"
-                
+
+                cache_key = f"{key_prefix}:{func.__name__}:{key_builder(func, kwargs)}"
+                entry_tags = [key_prefix, *(template.format(**kwargs) for template in tags)]
+
+                entry = await self._get_entry(key_prefix, cache_key, entry_tags)
+                if entry is not _MISSING:
+                    stale_age = time.time() - entry[3]
+                    if stale_ttl > 0 and stale_age > 0:
+                        self._refresh_in_background(
+                            key_prefix, cache_key, entry, entry_tags, ttl, stale_ttl, lock_ttl, func, args, kwargs
+                        )
+                        CACHE_STALE_AGE.labels(key_prefix).observe(stale_age)
+                        return self._replay(entry, kwargs, stale_age)
+                    if not _should_refresh_early(entry, early_refresh_beta):
+                        return self._replay(entry, kwargs)
+
+                if cache_key in self._inflight:
+                    # Значение уже пересчитывается в этом процессе
+                    if entry is not _MISSING:
+                        return self._replay(entry, kwargs)
+                    CACHE_STAMPEDE_WAITS.labels(key_prefix, "process").inc()
+                    shared = await self._wait_inflight(cache_key)
+                    if shared is not _MISSING:
+                        return self._replay(shared, kwargs)
+                    return await func(*args, **kwargs)
+
+                return await self._recompute(
+                    key_prefix, cache_key, entry, entry_tags, ttl, stale_ttl, lock_ttl, func, args, kwargs
+                )
+            return wrapper
+        return decorator
+
+    async def _get_entry(self, key_prefix: str, cache_key: str, entry_tags: list[str]) -> Any:
+        start = time.perf_counter()
+        try:
+            if self.local is not None:
+                entry = self.local.get(cache_key)
+                if entry is not _MISSING:
+                    CACHE_HITS.labels(key_prefix, "l1").inc()
+                    return entry
+            try:
+                cached = await self.redis.get(cache_key)
+            except Exception as e:
+                # Недоступный Redis - это промах, а не ошибка запроса
+                CACHE_ERRORS.labels(key_prefix, "get").inc()
+                logger.warning({"event": "cache_get_failed", "key": cache_key, "error": str(e)})
+                cached = None
+            if not cached:
+                CACHE_MISSES.labels(key_prefix).inc()
+                return _MISSING
+            CACHE_HITS.labels(key_prefix, "redis").inc()
+            entry = self.serializer.loads(cached)
+            if self.local is not None:
+                # L1 живет не дольше свежести записи: устаревшая уходит на обновление через Redis
+                self.local.set(cache_key, entry, max(0, entry[3] - time.time()), tags=entry_tags)
+            return entry
+        finally:
+            CACHE_LOOKUP_LATENCY.labels(key_prefix).observe(time.perf_counter() - start)
+
+    def tag_entry(self, pipe, cache_key: str, tags: Sequence[str], ttl: int):
+        """Регистрирует ключ в наборах тегов в рамках переданного pipeline"""
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, cache_key)
+            # The tag set must outlive every entry in it, and entries of different
+            # caches share tags: set a TTL on a new set, otherwise only extend it
+            # (EXPIRE NX/GT, Redis 7+)
+            pipe.expire(tag_key, ttl, nx=True)
+            pipe.expire(tag_key, ttl, gt=True)
+
+    async def _store_entry(self, cache_key: str, entry: tuple, entry_tags: list[str], ttl: int):
+        # ttl here is the full Redis lifetime, including any stale window
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.setex(cache_key, ttl, self.serializer.dumps(entry))
+            self.tag_entry(pipe, cache_key, entry_tags, ttl)
+            await pipe.execute()
+        if self.local is not None:
+            self.local.set(cache_key, entry, max(0, entry[3] - time.time()), tags=entry_tags)
+
+    async def _wait_inflight(self, cache_key: str) -> Any:
+        future = self._inflight[cache_key]
+        # wait() does not propagate the leader's cancellation to this request
+        await asyncio.wait({future})
+        if future.cancelled():
+            return _MISSING
+        return future.result()
+
+    async def _acquire_lock(self, cache_key: str, lock_ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        acquired = await self.redis.set(f"lock:{cache_key}", token, nx=True, px=int(lock_ttl * 1000))
+        return token if acquired else None
+
+    async def _release_lock(self, cache_key: str, token: str):
+        await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{cache_key}", token)
+
+    async def _wait_for_entry(self, cache_key: str, timeout: float) -> Any:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
                 cached = await self.redis.get(cache_key)
-                if cached:
-                    return pickle.loads(cached)
-                
+            except Exception:
+                return _MISSING
+            if cached:
+                return self.serializer.loads(cached)
+        return _MISSING
+
+    async def _recompute(self, key_prefix: str, cache_key: str, entry: Any, entry_tags: list[str], ttl: int,
+                         stale_ttl: int, lock_ttl: float, func: Callable, args: tuple, kwargs: dict) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            try:
+                token = await self._acquire_lock(cache_key, lock_ttl)
+                locked = token is not None
+            except Exception as e:
+                CACHE_ERRORS.labels(key_prefix, "lock").inc()
+                logger.warning({"event": "cache_lock_failed", "key": cache_key, "error": str(e)})
+                token, locked = None, True
+            if not locked:
+                # Пересчетом занят другой процесс: отдаем текущее значение или ждем новое
+                if entry is _MISSING:
+                    CACHE_STAMPEDE_WAITS.labels(key_prefix, "cluster").inc()
+                    entry = await self._wait_for_entry(cache_key, lock_ttl)
+                if entry is not _MISSING:
+                    future.set_result(entry)
+                    return self._replay(entry, kwargs)
+
+            start = time.perf_counter()
+            try:
                 result = await func(*args, **kwargs)
-                
-                await self.redis.setex(cache_key, ttl, pickle.dumps(result))
+            finally:
+                if token is not None:
+                    try:
+                        await self._release_lock(cache_key, token)
+                    except Exception as e:
+                        CACHE_ERRORS.labels(key_prefix, "lock").inc()
+                        logger.warning({"event": "cache_unlock_failed", "key": cache_key, "error": str(e)})
+            delta = time.perf_counter() - start
+            CACHE_COMPUTE_LATENCY.labels(key_prefix).observe(delta)
+
+            if isinstance(result, Response):
+                future.set_result(_MISSING)
                 return result
-            return wrapper
-        return decorator
 
-    async def invalidate(self, prefix: str):
+            response = _find_arg(kwargs, Response)
+            headers = list(response.headers.items()) if response is not None else []
+            cached_result = jsonable_encoder(result) if self.serializer.json_only else result
+            entry = (cached_result, headers, delta, time.time() + ttl)
+            try:
+                await self._store_entry(cache_key, entry, entry_tags, ttl + stale_ttl)
+            except Exception as e:
+                CACHE_ERRORS.labels(key_prefix, "set").inc()
+                logger.warning({"event": "cache_set_failed", "key": cache_key, "error": str(e)})
+            future.set_result(entry)
+            return result
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark as retrieved: there may be no followers to consume it
+                future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(cache_key, None)
+
+    def _refresh_in_background(self, key_prefix: str, cache_key: str, entry: tuple, entry_tags: list[str], ttl: int,
+                               stale_ttl: int, lock_ttl: float, func: Callable, args: tuple, kwargs: dict):
+        if cache_key in self._refreshing or cache_key in self._inflight:
+            return
+        self._refreshing.add(cache_key)
+
+        async def refresh():
+            try:
+                async with _detached_kwargs(kwargs) as detached:
+                    await self._recompute(
+                        key_prefix, cache_key, entry, entry_tags, ttl, stale_ttl, lock_ttl, func, args, detached
+                    )
+            except Exception as e:
+                logger.warning({"event": "cache_background_refresh_failed", "key": cache_key, "error": str(e)})
+            finally:
+                self._refreshing.discard(cache_key)
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @staticmethod
+    def _replay(entry: tuple, kwargs: dict, stale_age: float = 0.0) -> Any:
+        result, headers = entry[0], entry[1]
+        if stale_age > 0:
+            headers = [*headers, (STALE_AGE_HEADER.lower(), str(int(stale_age)))]
+        etag = next((value for name, value in headers if name == "etag"), None)
+        if _etag_matches(_find_arg(kwargs, Request), etag):
+            return Response(status_code=304, headers=dict(headers))
+        response = _find_arg(kwargs, Response)
+        if response is not None:
+            for name, value in headers:
+                response.headers[name] = value
+        return result
+
+    async def invalidate_tags(self, *tags: str, key_prefix: str = ""):
+        """
+        Сбрасывает записи с данными тегами. Вызывается после commit, поэтому
+        недоступный Redis не должен превращать сохраненную запись в ошибку:
+        сбой логируется, а записи доживают свой TTL.
+        """
+        if not tags:
+            return
+        if self.local is not None:
+            self.local.invalidate_tags(tags)
+
         if not self.redis:
             return
-        
-        keys = []
-        async for key in self.redis.scan_iter(f"{prefix}:*"):
-            keys.append(key)
-        
-        if keys:
-            await self.redis.delete(*keys)
-
-redis_cache = RedisCache()
\ No newline at end of file
+
+        try:
+            prefix_keys = [self._tag_key(prefix) for prefix in self._prefixes if prefix not in tags]
+            await self.redis.eval(
+                INVALIDATE_TAGS_SCRIPT, len(tags) + len(prefix_keys),
+                *(self._tag_key(tag) for tag in tags), *prefix_keys, len(tags)
+            )
+            if self.local is not None:
+                await self.redis.publish(self.channel, json.dumps(list(tags)))
+        except Exception as e:
+            CACHE_ERRORS.labels(key_prefix, "invalidate").inc()
+            logger.warning({"event": "cache_invalidate_failed", "tags": list(tags), "error": str(e)})
+
+    async def invalidate(self, prefix: str):
+        """Сбрасывает все записи, закэшированные с данным key_prefix"""
+        await self.invalidate_tags(prefix, key_prefix=prefix)
+
+redis_cache = RedisCache(
+    l1_size=settings.CACHE_L1_SIZE,
+    l1_ttl=settings.CACHE_L1_TTL,
+    serializer=CacheSerializer(
+        codec=settings.CACHE_CODEC,
+        compression=settings.CACHE_COMPRESSION,
+        compress_min_bytes=settings.CACHE_COMPRESS_MIN_BYTES
+    )
+)
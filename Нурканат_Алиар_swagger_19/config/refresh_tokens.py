@@ -0,0 +1,98 @@
+import hashlib
+import secrets
+from typing import Optional
+from redis.asyncio import Redis
+from config.settings import settings
+
+# Rotates the family's current token in one step. A token that is no longer
+# current means it was stolen or replayed, so the whole family is revoked.
+ROTATE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'current')
+if not current then
+    return {0}
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return {-1}
+end
+redis.call('HSET', KEYS[1], 'current', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, redis.call('HGET', KEYS[1], 'uid'), redis.call('HGET', KEYS[1], 'sub'),
+        redis.call('HGET', KEYS[1], 'role'), redis.call('HGET', KEYS[1], 'ver')}
+"""
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+class RefreshTokenReused(RefreshTokenError):
+    pass
+
+
+class RefreshTokenStore:
+    def __init__(self, ttl: int = 7 * 24 * 3600, key_prefix: str = "refresh_family"):
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.redis: Optional[Redis] = None
+
+    def init(self, redis: Redis):
+        self.redis = redis
+
+    def _family_key(self, family: str) -> str:
+        return f"{self.key_prefix}:{family}"
+
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def _new_token(family: str) -> str:
+        return f"{family}.{secrets.token_urlsafe(32)}"
+
+    async def issue(self, user_id: int, username: str, role: str, version: int) -> str:
+        if self.redis is None:
+            raise RuntimeError("Redis not initialized")
+        family = secrets.token_urlsafe(16)
+        token = self._new_token(family)
+        key = self._family_key(family)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "current": self._hash(token),
+                "uid": user_id,
+                "sub": username,
+                "role": role,
+                "ver": version,
+            })
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+        return token
+
+    async def rotate(self, token: str) -> tuple[str, dict]:
+        if self.redis is None:
+            raise RuntimeError("Redis not initialized")
+        family, _, secret = token.partition(".")
+        if not family or not secret:
+            raise RefreshTokenError("Malformed refresh token")
+        new_token = self._new_token(family)
+        result = await self.redis.eval(
+            ROTATE_SCRIPT, 1, self._family_key(family),
+            self._hash(token), self._hash(new_token), self.ttl
+        )
+        status = int(result[0])
+        if status == -1:
+            raise RefreshTokenReused("Refresh token reuse detected")
+        if status != 1:
+            raise RefreshTokenError("Refresh token expired or revoked")
+        uid, sub, role, ver = (value.decode() if isinstance(value, bytes) else value for value in result[1:])
+        return new_token, {"uid": int(uid), "sub": sub, "role": role, "ver": int(ver)}
+
+    async def revoke(self, token: str):
+        if self.redis is None:
+            return
+        family = token.partition(".")[0]
+        if family:
+            await self.redis.delete(self._family_key(family))
+
+
+refresh_tokens = RefreshTokenStore(ttl=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600)
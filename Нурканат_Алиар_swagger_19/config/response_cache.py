@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+from urllib.parse import parse_qsl, urlencode
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.redis_cache import (
+    redis_cache, CACHE_HITS, CACHE_MISSES, CACHE_ERRORS, CACHE_LOOKUP_LATENCY, STALE_AGE_HEADER
+)
+from config.token_cache import bearer_token, token_principal
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """Правило кэширования ответа: путь (регулярное выражение), TTL, заголовки Vary и теги"""
+    path: str
+    ttl: int = 30
+    vary: Sequence[str] = ()
+    tags: Sequence[str] = ()
+    method: str = "GET"
+    pattern: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "pattern", re.compile(self.path))
+
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _subject(scope: Scope) -> Optional[int]:
+    """ID пользователя из валидного access-токена; None - ответ не кэшируется"""
+    token = bearer_token(scope)
+    # Токены старого формата без uid/ver проверяются только через БД
+    principal = token_principal(token) if token else None
+    return principal["uid"] if principal else None
+
+
+def _etag_matches(scope: Scope, headers: list) -> bool:
+    header = _header(scope, b"if-none-match")
+    if not header:
+        return False
+    etag = next((value for name, value in headers if name == "etag"), None)
+    if etag is None:
+        return False
+    candidates = {candidate.strip() for candidate in header.decode("latin-1").split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCacheMiddleware:
+    """
+    Кэширует готовые ответы (тело и заголовки) в Redis.
+    Попадание в кэш - один GET и одна отправка, без валидации и сериализации.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[CacheRule] = (), key_prefix: str = "response"):
+        self.app = app
+        self.rules = rules
+        self.key_prefix = key_prefix
+
+    def _match(self, scope: Scope) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if scope["method"] == rule.method and rule.pattern.fullmatch(scope["path"]):
+                return rule
+        return None
+
+    def _cache_key(self, scope: Scope, rule: CacheRule, user_id: int) -> str:
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        vary = [(name, (_header(scope, name.lower().encode()) or b"").decode("latin-1")) for name in rule.vary]
+        digest = hashlib.blake2b(f"{query}|{vary}".encode(), digest_size=16).hexdigest()
+        return f"{self.key_prefix}:{scope['method']}:{scope['path']}:{user_id}:{digest}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or redis_cache.redis is None:
+            await self.app(scope, receive, send)
+            return
+        rule = self._match(scope)
+        user_id = _subject(scope) if rule is not None else None
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        cache_key = self._cache_key(scope, rule, user_id)
+        start_time = time.perf_counter()
+        try:
+            cached = await redis_cache.redis.get(cache_key)
+        except Exception as e:
+            CACHE_ERRORS.labels(self.key_prefix, "get").inc()
+            logger.warning({"event": "response_cache_get_failed", "error": str(e)})
+            await self.app(scope, receive, send)
+            return
+        CACHE_LOOKUP_LATENCY.labels(self.key_prefix).observe(time.perf_counter() - start_time)
+
+        if cached:
+            CACHE_HITS.labels(self.key_prefix, "redis").inc()
+            await self._send_cached(scope, cached, send)
+            return
+        CACHE_MISSES.labels(self.key_prefix).inc()
+
+        start: Optional[Message] = None
+        body = []
+
+        async def send_wrapper(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                message = {**message, "headers": [*message.get("headers", []), (b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        if start is None or start["status"] != 200:
+            return
+        headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in start.get("headers", [])]
+        # Устаревший ответ (stale-while-revalidate) не кэшируется повторно с замороженным возрастом
+        if any(
+            name in ("set-cookie", STALE_AGE_HEADER.lower()) or (name == "cache-control" and "no-store" in value)
+            for name, value in headers
+        ):
+            return
+        await self._store(cache_key, rule, user_id, headers, b"".join(body))
+
+    async def _store(self, cache_key: str, rule: CacheRule, user_id: int, headers: list, body: bytes):
+        # Формат значения: JSON с заголовками, перевод строки, затем тело как есть
+        value = json.dumps(headers, separators=(",", ":")).encode() + b"\n" + body
+        try:
+            async with redis_cache.redis.pipeline(transaction=True) as pipe:
+                pipe.setex(cache_key, rule.ttl, value)
+                redis_cache.tag_entry(pipe, cache_key, [template.format(uid=user_id) for template in rule.tags], rule.ttl)
+                await pipe.execute()
+        except Exception as e:
+            CACHE_ERRORS.labels(self.key_prefix, "set").inc()
+            logger.warning({"event": "response_cache_set_failed", "error": str(e)})
+
+    async def _send_cached(self, scope: Scope, cached: bytes, send: Send):
+        raw_headers, _, body = cached.partition(b"\n")
+        headers = json.loads(raw_headers)
+        if _etag_matches(scope, headers):
+            status = 304
+            body = b""
+            headers = [(name, value) for name, value in headers if name not in ("content-length", "content-type")]
+        else:
+            status = 200
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                *((name.encode("latin-1"), value.encode("latin-1")) for name, value in headers),
+                (b"x-cache", b"HIT"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
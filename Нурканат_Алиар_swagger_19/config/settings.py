@@ -1,5 +1,22 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import  RedisDsn, Field, AnyUrl
+from pydantic import  RedisDsn, Field, AnyUrl, BaseModel, model_validator
+
+
+class RateLimitPolicy(BaseModel):
+    """
+    Политика лимита: к каким запросам применяется (path - регулярное
+    выражение, methods, roles), по какому ключу считается (ip, sub, role)
+    и сколько стоит запрос (costs: регулярное выражение пути -> вес)
+    """
+    name: str
+    path: str = ".*"
+    methods: list[str] = []
+    roles: list[str] = []
+    key: Literal["ip", "sub", "role"] = "ip"
+    limit: int = Field(..., gt=0)
+    window: int = Field(..., gt=0)
+    costs: dict[str, int] = {}
 
 
 class Settings(BaseSettings):
@@ -8,6 +25,12 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(..., min_length=1, env="SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    AUTH_CACHE_SIZE: int = 1024
+    AUTH_CACHE_TTL: int = 60
+    HASH_POOL_SIZE: int = 2
+    HASH_QUEUE_SIZE: int = 16
+    TOKEN_VERSION_SYNC_INTERVAL: float = 5.0
 
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
     DB_POOL_SIZE: int = 5
@@ -17,11 +40,63 @@ class Settings(BaseSettings):
     REDIS_POOL_SIZE: int = 5
     RATE_LIMIT_REQUESTS: int = Field(..., env="RATE_LIMIT_REQUESTS")
     RATE_LIMIT_WINDOW: int = Field(..., env="RATE_LIMIT_WINDOW")
+    RATE_LIMIT_MODE: str = "redis"
+    RATE_LIMIT_LEASE_SIZE: int = 10
+    RATE_LIMIT_LEASE_TTL: float = 1.0
+    # JSON-список RateLimitPolicy; если не задан, собирается из значений по умолчанию ниже
+    RATE_LIMIT_POLICIES: list[RateLimitPolicy] = []
+    CACHE_L1_SIZE: int = 1024
+    CACHE_L1_TTL: float = 5.0
+    CACHE_CODEC: str = "json"
+    CACHE_COMPRESSION: str = "none"
+    CACHE_COMPRESS_MIN_BYTES: int = 1024
+    RESPONSE_CACHE_TTL: int = 30
+
+    NOTES_BULK_MAX_ITEMS: int = 500
+    NOTES_EXPORT_CHUNK_SIZE: int = 500
+    NOTES_IMPORT_BATCH_SIZE: int = 1000
+    NOTES_IMPORT_MAX_LINE_BYTES: int = 16384
+    NOTES_IMPORT_MAX_ERRORS: int = 100
+
+    ADMISSION_INITIAL_LIMIT: int = 100
+    ADMISSION_MIN_LIMIT: int = 10
+    ADMISSION_MAX_LIMIT: int = 1000
+    ADMISSION_TARGET_LATENCY: float = 0.5
+    ADMISSION_MAX_LOOP_LAG: float = 0.1
+    ADMISSION_ADJUST_INTERVAL: float = 1.0
 
     CORS_ORIGINS: str = "*"
     CORS_METHODS: str = "*"
     CORS_HEADERS: str = "*"
     
+    @model_validator(mode="after")
+    def default_rate_limit_policies(self):
+        if not self.RATE_LIMIT_POLICIES:
+            self.RATE_LIMIT_POLICIES = [
+                # Общий бюджет: по пользователю из токена, для анонимов - по IP
+                RateLimitPolicy(
+                    name="default",
+                    key="sub",
+                    limit=self.RATE_LIMIT_REQUESTS,
+                    window=self.RATE_LIMIT_WINDOW,
+                    costs={
+                        r"/notes/(import|export)": 10,
+                        r"/notes/bulk": 5,
+                        r"/notes/search": 2,
+                    }
+                ),
+                # bcrypt на каждый вызов: отдельный жесткий лимит по IP
+                RateLimitPolicy(
+                    name="auth",
+                    path=r"/users/(login|register)/",
+                    methods=["POST"],
+                    key="ip",
+                    limit=10,
+                    window=60
+                ),
+            ]
+        return self
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
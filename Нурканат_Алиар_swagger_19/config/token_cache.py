@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from jose import jwt, JWTError
+from config.settings import settings
+from config.token_versions import token_versions
+
+
+class TokenCache:
+    def __init__(self, maxsize: int = 1024, ttl: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, str, Any]]" = OrderedDict()
+        self._tokens_by_subject: dict[str, set[str]] = {}
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            return None
+        self._entries.move_to_end(token)
+        return value
+
+    def set(self, token: str, subject: str, value: Any, exp: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        # Never keep an entry longer than the token itself is valid
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if expires_at <= now:
+            return
+
+        self._remove(token)
+        self._entries[token] = (expires_at, subject, value)
+        self._tokens_by_subject.setdefault(subject, set()).add(token)
+
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def invalidate_subject(self, subject: str):
+        for token in self._tokens_by_subject.pop(subject, set()):
+            self._entries.pop(token, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_subject.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        subject = entry[1]
+        tokens = self._tokens_by_subject.get(subject)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_subject[subject]
+
+
+token_cache = TokenCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
+
+def bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            if value.lower().startswith(b"bearer "):
+                return value[7:].decode("latin-1")
+            return None
+    return None
+
+
+def token_principal(token: str) -> Optional[dict]:
+    """
+    uid, sub и role из валидного токена актуальной версии - для middleware,
+    которым нужен пользователь до роутинга. Токены без этих claims дают None.
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        principal = {"uid": user.id, "sub": user.username, "role": user.role, "ver": user.token_version}
+    else:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            return None
+        if not all(claim in payload for claim in ("sub", "uid", "role", "ver")):
+            return None
+        principal = {claim: payload[claim] for claim in ("uid", "sub", "role", "ver")}
+    if not token_versions.is_current(principal["uid"], principal["ver"]):
+        return None
+    return principal
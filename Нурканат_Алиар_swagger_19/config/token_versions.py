@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Optional
+from redis.asyncio import Redis
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Only ever move a user's version forward, even if bumps arrive out of order
+BUMP_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local version = tonumber(ARGV[2])
+if version > current then
+    redis.call('HSET', KEYS[1], ARGV[1], version)
+    return version
+end
+return current
+"""
+
+
+class TokenVersionStore:
+    def __init__(self, key: str = "auth:token_versions", sync_interval: float = 5.0):
+        self.key = key
+        self.sync_interval = sync_interval
+        self.redis: Optional[Redis] = None
+        self._versions: dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+
+    async def start(self, redis: Redis):
+        self.redis = redis
+        await self.sync()
+        self._task = asyncio.create_task(self._sync_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.redis = None
+
+    async def sync(self):
+        if self.redis is None:
+            return
+        try:
+            raw = await self.redis.hgetall(self.key)
+        except Exception as e:
+            logger.warning({"event": "token_versions_sync_failed", "error": str(e)})
+            return
+        # Версии только растут: bump, не дошедший до Redis, не откатывается синхронизацией
+        for user_id, version in raw.items():
+            self._raise(int(user_id), int(version))
+
+    async def load(self, versions: dict[int, int]):
+        """
+        Версии из БД (источник истины) при старте воркера: если ключ в Redis
+        потерян (flush, вытеснение), отозванные токены не оживают
+        """
+        for user_id, version in versions.items():
+            self._raise(user_id, version)
+        if self.redis is None or not versions:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id, version in versions.items():
+                    pipe.eval(BUMP_SCRIPT, 1, self.key, user_id, version)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning({"event": "token_versions_load_failed", "error": str(e)})
+
+    def clear(self):
+        self._versions.clear()
+
+    def _raise(self, user_id: int, version: int):
+        if version > self._versions.get(user_id, 0):
+            self._versions[user_id] = version
+
+    async def _sync_forever(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def is_current(self, user_id: int, version: int) -> bool:
+        return version >= self._versions.get(user_id, 0)
+
+    async def bump(self, user_id: int, version: int):
+        self._raise(user_id, version)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.eval(BUMP_SCRIPT, 1, self.key, user_id, version)
+        except Exception as e:
+            logger.warning({"event": "token_versions_bump_failed", "user_id": user_id, "error": str(e)})
+
+    def publish(self, user_id: int, version: int):
+        """Планирует bump из синхронного кода (например, из событий ORM)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._raise(user_id, version)
+            return
+        task = loop.create_task(self.bump(user_id, version))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+
+token_versions = TokenVersionStore(sync_interval=settings.TOKEN_VERSION_SYNC_INTERVAL)
@@ -1,7 +1,7 @@
 import logging
 import json
 from pythonjsonlogger import jsonlogger
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from prometheus_fastapi_instrumentator import Instrumentator
 from metadata import lifespan
 from users import router as users_router
@@ -10,7 +10,9 @@ from websocket.webs import router as ws_router
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 from config.settings import settings
-from config.middleware import RateLimiterMiddleware
+from config.middleware import RateLimiterMiddleware, RequestLoggingMiddleware
+from config.response_cache import ResponseCacheMiddleware, CacheRule
+from config.admission import AdmissionController
 
 
 logger = logging.getLogger()
@@ -75,23 +77,23 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Кэш готовых ответов стоит внутри rate limiter, чтобы попадания тоже учитывались в лимите
+app.add_middleware(
+    ResponseCacheMiddleware,
+    rules=[
+        CacheRule(path=r"/notes/", ttl=settings.RESPONSE_CACHE_TTL, tags=["user:{uid}:notes"]),
+        CacheRule(path=r"/notes/\d+", ttl=settings.RESPONSE_CACHE_TTL, tags=["user:{uid}:notes"]),
+    ]
+)
+
 # Add the rate limiter middleware
 app.add_middleware(RateLimiterMiddleware)
 
+# Чистые ASGI-middleware: без лишней задачи и буфера на каждый запрос
+app.add_middleware(RequestLoggingMiddleware)
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info({
-        "event": "request",
-        "method": request.method,
-        "url": str(request.url)
-    })
-    response = await call_next(request)
-    logger.info({
-        "event": "response",
-        "status_code": response.status_code
-    })
-    return response
+# Сброс нагрузки снаружи остальных слоев: отказ должен стоить как можно меньше
+app.add_middleware(AdmissionController)
 
 
 @app.get(
@@ -140,6 +142,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=settings.CORS_METHODS,
     allow_headers=settings.CORS_HEADERS,
+    expose_headers=[
+        "X-Next-Cursor", "ETag", "X-Cache-Stale-Age", "X-Cache",
+        "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After",
+    ],
 )
 
 if __name__ == "__main__":
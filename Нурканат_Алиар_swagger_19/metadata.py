@@ -7,11 +7,15 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from typing import Optional, Annotated
 from sqlalchemy.orm import DeclarativeBase
 from fastapi import Depends
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, select
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncSession
 from config.redis_cache import redis_cache
 from config.settings import settings
+from config.hashing import password_hasher
+from config.token_versions import token_versions
+from config.refresh_tokens import refresh_tokens
+from config.admission import admission_limit
 load_dotenv()
 
 CURRENT_DATETIME = datetime.now(UTC)  
@@ -40,11 +44,20 @@ class Base(DeclarativeBase):
 @asynccontextmanager
 async def lifespan(app):
     await redis_cache.init_redis(str(settings.REDIS_URL))
+    await token_versions.start(redis_cache.redis)
+    refresh_tokens.init(redis_cache.redis)
+    await admission_limit.start()
     
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        users = SQLModel.metadata.tables["user"]
+        rows = await conn.execute(select(users.c.id, users.c.token_version).where(users.c.token_version > 0))
+        await token_versions.load({user_id: version for user_id, version in rows})
     
     yield
     
+    await admission_limit.stop()
+    await token_versions.stop()
     await redis_cache.close()
-    await engine.dispose()
\ No newline at end of file
+    await engine.dispose()
+    password_hasher.shutdown()
\ No newline at end of file
@@ -1,9 +1,11 @@
-from sqlalchemy import select
+from sqlalchemy import select, event, inspect, Index, Column, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
 from sqlmodel import SQLModel, Field, Relationship
 from pydantic import BaseModel, Field as PydanticField
 from typing import Optional, List
 from metadata import (
-    CURRENT_DATETIME,
     SECRET_KEY,
     ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -13,9 +15,14 @@ from metadata import (
 )
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, UTC
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from config.token_cache import token_cache
+from config.hashing import password_hasher
+from config.token_versions import token_versions
+from config.settings import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -42,10 +49,21 @@ class User(SQLModel, table=True):
         default="user",
         description="Роль пользователя в системе"
     )
+    token_version: int = Field(
+        default=0,
+        sa_column_kwargs={"server_default": "0"},
+        description="Версия токенов пользователя; увеличение отзывает все выданные токены"
+    )
     notes: List["Note"] = Relationship(back_populates="owner")
 
+# Конфигурация to_tsvector для колонки note.search_vector (см. миграцию c4a1f0d9b6e3)
+NOTE_SEARCH_CONFIG = "simple"
+
 class Note(SQLModel, table=True):
     """Модель заметки в базе данных"""
+    __table_args__ = (
+        Index("ix_note_owner_id_id", "owner_id", "id"),
+    )
     id: Optional[int] = Field(
         primary_key=True, 
         default=None,
@@ -63,8 +81,35 @@ class Note(SQLModel, table=True):
         foreign_key="user.id",
         description="ID владельца заметки"
     )
+    version: int = Field(
+        default=1,
+        sa_column_kwargs={"server_default": "1"},
+        description="Версия заметки; увеличивается при каждом изменении (основа ETag)"
+    )
     owner: Optional[User] = Relationship(back_populates="notes")
 
+# Колонка полнотекстового поиска генерируется PostgreSQL (как в миграции c4a1f0d9b6e3).
+# Она есть в таблице, но не в модели: select(Note) не читает tsvector с каждой заметкой
+note_search_vector = Column(
+    "search_vector",
+    TSVECTOR,
+    Computed(
+        f"setweight(to_tsvector('{NOTE_SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{NOTE_SEARCH_CONFIG}', coalesce(content, '')), 'B')",
+        persisted=True
+    ),
+    info={"postgresql_only": True}
+)
+Note.__table__.append_column(note_search_vector)
+Index("ix_note_search_vector", note_search_vector, postgresql_using="gin").ddl_if(dialect="postgresql")
+
+@compiles(CreateColumn, "sqlite")
+def skip_postgresql_only_columns(element, compiler, **kw):
+    # В SQLite (тесты) нет tsvector и to_tsvector: колонка не создается
+    if element.element.info.get("postgresql_only"):
+        return None
+    return compiler.visit_create_column(element, **kw)
+
 # Pydantic Models для API
 class UserCreate(BaseModel):
     """Модель для создания нового пользователя"""
@@ -208,6 +253,96 @@ class NoteOut(BaseModel):
             }
         }
 
+class NoteBulkCreate(BaseModel):
+    """Модель для массового создания заметок"""
+    items: List[NoteCreate] = PydanticField(
+        min_length=1,
+        max_length=settings.NOTES_BULK_MAX_ITEMS,
+        description="Заметки для создания"
+    )
+
+class NoteBulkUpdateItem(NoteUpdate):
+    """Изменение одной заметки в массовом обновлении"""
+    id: int = PydanticField(
+        description="ID обновляемой заметки",
+        example=1
+    )
+
+class NoteBulkUpdate(BaseModel):
+    """Модель для массового обновления заметок"""
+    items: List[NoteBulkUpdateItem] = PydanticField(
+        min_length=1,
+        max_length=settings.NOTES_BULK_MAX_ITEMS,
+        description="Изменения заметок; ID не должны повторяться"
+    )
+
+class NoteBulkDelete(BaseModel):
+    """Модель для массового удаления заметок"""
+    ids: List[int] = PydanticField(
+        min_length=1,
+        max_length=settings.NOTES_BULK_MAX_ITEMS,
+        description="ID удаляемых заметок",
+        example=[1, 2, 3]
+    )
+
+class NoteBulkResult(BaseModel):
+    """Результат обработки одного элемента массовой операции"""
+    index: int = PydanticField(
+        description="Позиция элемента в запросе",
+        example=0
+    )
+    id: Optional[int] = PydanticField(
+        None,
+        description="ID заметки",
+        example=1
+    )
+    status: str = PydanticField(
+        description="created, updated, deleted или not_found",
+        example="created"
+    )
+    note: Optional[NoteOut] = PydanticField(
+        None,
+        description="Заметка после операции (для created и updated)"
+    )
+
+class NoteImportError(BaseModel):
+    """Описание отклоненной строки импорта"""
+    line: int = PydanticField(
+        description="Номер строки во входных данных (с 1)",
+        example=3
+    )
+    error: str = PydanticField(
+        description="Причина отклонения",
+        example="title: String should have at least 1 character"
+    )
+
+class NoteImportResult(BaseModel):
+    """Итог импорта заметок"""
+    accepted: int = PydanticField(
+        description="Количество импортированных заметок",
+        example=99998
+    )
+    rejected: int = PydanticField(
+        description="Количество отклоненных строк",
+        example=2
+    )
+    errors: List[NoteImportError] = PydanticField(
+        default_factory=list,
+        description="Первые ошибки (не более NOTES_IMPORT_MAX_ERRORS)"
+    )
+
+class NoteSearchOut(NoteOut):
+    """Модель результата полнотекстового поиска"""
+    rank: float = PydanticField(
+        description="Релевантность заметки запросу",
+        example=0.6079
+    )
+    headline: Optional[str] = PydanticField(
+        None,
+        description="Фрагмент содержимого с подсвеченными совпадениями (при highlight=true)",
+        example="Купить <b>молоко</b> и хлеб"
+    )
+
 class Token(BaseModel):
     """Модель токена доступа"""
     access_token: str = PydanticField(
@@ -218,15 +353,28 @@ class Token(BaseModel):
         description="Тип токена",
         example="bearer"
     )
+    refresh_token: Optional[str] = PydanticField(
+        None,
+        description="Одноразовый refresh-токен для получения нового токена доступа",
+        example="q3Vt9xk2Lr0aYp1n.Xb8c..."
+    )
     
     class Config:
         json_schema_extra = {
             "example": {
                 "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
-                "token_type": "bearer"
+                "token_type": "bearer",
+                "refresh_token": "q3Vt9xk2Lr0aYp1n.Xb8c..."
             }
         }
 
+class RefreshRequest(BaseModel):
+    """Модель запроса на обновление токена доступа"""
+    refresh_token: str = PydanticField(
+        description="Refresh-токен, полученный при входе или предыдущем обновлении",
+        example="q3Vt9xk2Lr0aYp1n.Xb8c..."
+    )
+
 
 # Helper functions
 def hash_password(password: str) -> str:
@@ -235,6 +383,12 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed_password: str) -> bool:
     return pwd_context.verify(password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run("hash", hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await password_hasher.run("verify", verify_password, password, hashed_password)
+
 async def get_user(username: str, session: AsyncSession):
     stmt = select(User).where(User.username == username)
     result = await session.execute(stmt)
@@ -242,32 +396,102 @@ async def get_user(username: str, session: AsyncSession):
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    # Срок отсчитывается от момента выдачи, а не от запуска процесса
+    now = datetime.now(UTC)
     if expires_delta:
-        expire = CURRENT_DATETIME + expires_delta
+        expire = now + expires_delta
     else:
-        expire = CURRENT_DATETIME + timedelta(minutes=15)
+        expire = now + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user: User, expires_delta: Optional[timedelta] = None):
+    """Токен с claims, достаточными для авторизации без обращения к БД"""
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "role": user.role,
+            "ver": user.token_version,
+        },
+        expires_delta=expires_delta
+    )
+
+def user_from_claims(payload: dict) -> Optional[User]:
+    if not all(claim in payload for claim in ("sub", "uid", "role", "ver")):
+        return None
+    return User(
+        id=payload["uid"],
+        username=payload["sub"],
+        role=payload["role"],
+        token_version=payload["ver"]
+    )
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = await get_user(username, db)
+    user = token_cache.get(token)
     if user is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
+            raise credentials_exception
+        user = user_from_claims(payload)
+        if user is None:
+            # Токены старого формата без claims проверяются через БД. Версия такого
+            # токена считается нулевой: после logout или смены роли он отозван
+            db_user = await get_user(username, db)
+            token_version = payload.get("ver", 0)
+            if db_user is None or db_user.token_version > token_version:
+                raise credentials_exception
+            user = User(id=db_user.id, username=db_user.username, role=db_user.role, token_version=token_version)
+        token_cache.set(token, username, user, exp=payload.get("exp"))
+    if not token_versions.is_current(user.id, user.token_version):
         raise credentials_exception
     return user
 
+@event.listens_for(User, "before_update")
+def bump_token_version(mapper, connection, target):
+    # Смена роли или пароля отзывает все ранее выданные токены пользователя
+    state = inspect(target)
+    if state.attrs.token_version.history.has_changes():
+        return
+    if state.attrs.role.history.has_changes() or state.attrs.password.history.has_changes():
+        target.token_version = (target.token_version or 0) + 1
+
+@event.listens_for(User, "after_update")
+def invalidate_cached_user(mapper, connection, target):
+    # Смена роли, пароля или имени должна сразу сбрасывать закешированных пользователей
+    state = inspect(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in ("username", "role", "password", "token_version")):
+        return
+    for username in [target.username, *state.attrs.username.history.deleted]:
+        token_cache.invalidate_subject(username)
+    if state.attrs.token_version.history.has_changes():
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("token_versions", {})[target.id] = target.token_version
+
+@event.listens_for(User, "after_delete")
+def invalidate_deleted_user(mapper, connection, target):
+    token_cache.invalidate_subject(target.username)
+
+@event.listens_for(Session, "after_commit")
+def publish_token_versions(session):
+    for user_id, version in session.info.pop("token_versions", {}).items():
+        token_versions.publish(user_id, version)
+
+@event.listens_for(Session, "after_rollback")
+def discard_token_versions(session):
+    session.info.pop("token_versions", None)
+
 def require_owner(current_user: User = Depends(get_current_user)):
     async def check_owner(note: Note):
         if note.owner_id != current_user.id:
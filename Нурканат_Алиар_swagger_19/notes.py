@@ -1,14 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import ValidationError
+from sqlalchemy import case, func, literal_column, insert, update, delete, values, column, Integer, String
 from sqlmodel import select
-from metadata import SessionDep
-from models import Note, NoteCreate, NoteOut, NoteUpdate, User, get_current_user
+from metadata import SessionDep, session_factory
+from models import (
+    Note, NoteCreate, NoteOut, NoteUpdate, NoteSearchOut, User, get_current_user, NOTE_SEARCH_CONFIG, note_search_vector,
+    NoteBulkCreate, NoteBulkUpdate, NoteBulkDelete, NoteBulkResult, NoteImportResult, NoteImportError
+)
 from config.redis_cache import redis_cache
+from config.settings import settings
 
 router = APIRouter(
     prefix="/notes",
     tags=["notes"]
 )
 
+def encode_cursor(note_id: int) -> str:
+    return base64.urlsafe_b64encode(str(note_id).encode()).decode().rstrip("=")
+
+# note.id - INTEGER (SERIAL): больший ID в курсоре драйвер БД не примет
+MAX_CURSOR_ID = 2 ** 31 - 1
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        note_id = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not 0 <= note_id <= MAX_CURSOR_ID:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return note_id
+
+NOTE_FIELDS = tuple(NoteOut.model_fields)
+
+def parse_note_fields(fields: Optional[str]) -> Optional[list[str]]:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(NOTE_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(NOTE_FIELDS)}"
+        )
+    return [field for field in NOTE_FIELDS if field in requested]
+
+def note_columns(fields: list[str]):
+    # id и version нужны для курсора и ETag, даже если клиент их не запросил
+    names = dict.fromkeys(["id", "version", *fields])
+    return [getattr(Note, name) for name in names]
+
+def note_etag(note_id: int, version: int, fields: Optional[list[str]] = None) -> str:
+    if fields:
+        return f'"{note_id}-{version}-{",".join(fields)}"'
+    return f'"{note_id}-{version}"'
+
+def notes_etag(rows, fields: Optional[list[str]] = None) -> str:
+    source = ",".join(f"{row.id}:{row.version}" for row in rows)
+    if fields:
+        source += "|" + ",".join(fields)
+    return f'"{hashlib.sha1(source.encode()).hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+
+NOTES_CACHE_TAG = "user:{current_user.id}:notes"
+
+async def invalidate_notes_cache(owner_id: int):
+    await redis_cache.invalidate_tags(f"user:{owner_id}:notes", key_prefix="notes")
+
+def is_postgres(session) -> bool:
+    return session.bind.dialect.name == "postgresql"
+
+def note_search_filter(session, search: str):
+    if is_postgres(session):
+        query = func.websearch_to_tsquery(NOTE_SEARCH_CONFIG, search)
+        return note_search_vector.op("@@")(query)
+    # SQLite в тестах: полнотекстового поиска нет, используем ILIKE
+    search_term = f"%{search}%"
+    return Note.title.ilike(search_term) | Note.content.ilike(search_term)
+
 @router.post(
     "/", 
     response_model=NoteOut,
@@ -69,8 +155,9 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
     """Создание новой заметки"""
     new_note = Note(title=note.title, content=note.content, owner_id=current_user.id)
     session.add(new_note)
+    # INSERT уже возвращает ID, а expire_on_commit=False сохраняет атрибуты: refresh не нужен
     await session.commit()
-    await session.refresh(new_note)
+    await invalidate_notes_cache(current_user.id)
     return new_note
 
 @router.get(
@@ -81,11 +168,23 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
     Возвращает список заметок текущего пользователя с поддержкой:
     
     Фильтрация:
-    - Поиск по заголовку и содержимому заметок
+    - Полнотекстовый поиск по заголовку и содержимому заметок (GIN-индекс в PostgreSQL)
     
     Пагинация:
-    - skip: количество записей для пропуска (по умолчанию 0)
+    - cursor: курсор следующей страницы из заголовка `X-Next-Cursor` предыдущего ответа
     - limit: максимальное количество записей (по умолчанию 10, максимум 100)
+    - skip: количество записей для пропуска (устарело, оставлено для совместимости; игнорируется вместе с cursor)
+    
+    Заметки упорядочены по ID. Если есть следующая страница, её курсор
+    возвращается в заголовке `X-Next-Cursor`; стоимость запроса не зависит от глубины страницы.
+    
+    Выбор полей:
+    - fields: список полей через запятую (например, `fields=id,title`);
+      из базы читаются и в ответ попадают только эти колонки
+    
+    Условные запросы:
+    - Ответ содержит заголовок ETag, вычисленный по ID и версиям заметок страницы
+    - При совпадении If-None-Match возвращается 304 без тела (читаются только ID и версии)
     
     Кеширование:
     - Результаты кешируются на 60 секунд для улучшения производительности
@@ -112,6 +211,9 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
                 }
             }
         },
+        304: {
+            "description": "Страница не изменилась (совпал If-None-Match)"
+        },
         401: {
             "description": "Пользователь не аутентифицирован",
             "content": {
@@ -122,27 +224,547 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
         }
     }
 )
-@redis_cache.cache(key_prefix="notes", ttl=60)
+@redis_cache.cache(key_prefix="notes", ttl=60, tags=[NOTES_CACHE_TAG], early_refresh_beta=1.0, stale_ttl=30)
 async def list_notes(
     session: SessionDep, 
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user), 
-    skip: int = Query(0, ge=0, description="Количество записей для пропуска"),
-    limit: int = Query(10, le=100, description="Максимальное количество записей"),
-    search: str = Query(None, description="Поиск по заголовку и содержимому")
+    skip: int = Query(0, ge=0, description="Количество записей для пропуска (устарело, используйте cursor)"),
+    limit: int = Query(10, ge=1, le=100, description="Максимальное количество записей"),
+    search: str = Query(None, description="Поиск по заголовку и содержимому"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую, например id,title")
     ):
-    """Получение списка заметок с поиском и пагинацией"""
+    """Получение списка заметок с поиском и keyset-пагинацией"""
+    selected = parse_note_fields(fields)
 
     stmt = select(Note).where(Note.owner_id == current_user.id)
     if search:
-        search_term = f"%{search}%"
-        stmt = stmt.where(
-            (Note.title.ilike(search_term)) | (Note.content.ilike(search_term))
+        stmt = stmt.where(note_search_filter(session, search))
+    stmt = stmt.order_by(Note.owner_id, Note.id)
+    if cursor:
+        stmt = stmt.where(Note.id > decode_cursor(cursor))
+    else:
+        stmt = stmt.offset(skip)
+    stmt = stmt.limit(limit)
+
+    if request.headers.get("if-none-match"):
+        keys = (await session.execute(stmt.with_only_columns(Note.id, Note.version))).all()
+        etag = notes_etag(keys, selected)
+        if etag_matches(request, etag):
+            headers = {"X-Next-Cursor": encode_cursor(keys[-1].id)} if len(keys) == limit else None
+            return not_modified(etag, headers)
+
+    if selected:
+        # Только запрошенные колонки: большие поля не читаются с диска и не сериализуются
+        rows = (await session.execute(stmt.with_only_columns(*note_columns(selected)))).all()
+        headers = {"ETag": notes_etag(rows, selected)}
+        if len(rows) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+        return JSONResponse(
+            content=[{field: getattr(row, field) for field in selected} for row in rows],
+            headers=headers
         )
-    stmt = stmt.offset(skip).limit(limit)
+
     result = await session.execute(stmt)
     notes = result.scalars().all()
+    if len(notes) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(notes[-1].id)
+    response.headers["ETag"] = notes_etag(notes)
     return notes
 
+@router.get(
+    "/search",
+    response_model=list[NoteSearchOut],
+    summary="Полнотекстовый поиск заметок",
+    description="""
+    Ищет заметки текущего пользователя по заголовку и содержимому.
+    
+    Особенности:
+    - Поддерживается синтаксис веб-поиска: "точная фраза", OR, -исключение
+    - Результаты отсортированы по релевантности (совпадения в заголовке весят больше)
+    - highlight=true добавляет фрагменты содержимого с подсвеченными совпадениями
+    
+    Параметры:
+    - q: поисковый запрос
+    - skip / limit: пагинация по отсортированной выдаче
+    """,
+    responses={
+        200: {
+            "description": "Найденные заметки",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "id": 1,
+                            "title": "Список покупок",
+                            "content": "Купить молоко и хлеб",
+                            "owner_id": 1,
+                            "rank": 0.6079,
+                            "headline": "Купить <b>молоко</b> и хлеб"
+                        }
+                    ]
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def search_notes(
+    session: SessionDep,
+    current_user: User = Depends(get_current_user),
+    q: str = Query(..., min_length=1, max_length=200, description="Поисковый запрос"),
+    skip: int = Query(0, ge=0, description="Количество записей для пропуска"),
+    limit: int = Query(10, ge=1, le=100, description="Максимальное количество записей"),
+    highlight: bool = Query(False, description="Вернуть фрагменты с подсветкой совпадений")
+    ):
+    """Полнотекстовый поиск заметок с ранжированием"""
+    if is_postgres(session):
+        query = func.websearch_to_tsquery(NOTE_SEARCH_CONFIG, q)
+        rank = func.ts_rank(note_search_vector, query)
+        headline = func.ts_headline(
+            NOTE_SEARCH_CONFIG, Note.content, query, "MaxFragments=2, MinWords=5, MaxWords=20"
+        )
+        match = note_search_vector.op("@@")(query)
+    else:
+        rank = case((Note.title.ilike(f"%{q}%"), 1.0), else_=0.5)
+        headline = literal_column("NULL")
+        match = note_search_filter(session, q)
+
+    columns = [Note, rank.label("rank")]
+    if highlight:
+        columns.append(headline.label("headline"))
+    stmt = (
+        select(*columns)
+        .where(Note.owner_id == current_user.id, match)
+        .order_by(rank.desc(), Note.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return [
+        NoteSearchOut(
+            id=row.Note.id,
+            title=row.Note.title,
+            content=row.Note.content,
+            owner_id=row.Note.owner_id,
+            rank=row.rank,
+            headline=row.headline if highlight else None
+        )
+        for row in result
+    ]
+
+BULK_NOTE_COLUMNS = (Note.id, Note.title, Note.content, Note.owner_id)
+
+def note_row_out(row) -> NoteOut:
+    return NoteOut(id=row.id, title=row.title, content=row.content, owner_id=row.owner_id)
+
+@router.post(
+    "/bulk",
+    response_model=list[NoteBulkResult],
+    status_code=201,
+    summary="Массовое создание заметок",
+    description="""
+    Создает несколько заметок текущего пользователя одним запросом INSERT ... RETURNING.
+    
+    Ограничения:
+    - Не более NOTES_BULK_MAX_ITEMS заметок за запрос
+    - Валидация каждой заметки как при обычном создании
+    
+    Возвращает результат для каждого элемента в порядке запроса.
+    """,
+    responses={
+        201: {
+            "description": "Заметки созданы",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "index": 0,
+                            "id": 1,
+                            "status": "created",
+                            "note": {"id": 1, "title": "Первая", "content": "Текст", "owner_id": 1}
+                        }
+                    ]
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def bulk_create_notes(payload: NoteBulkCreate, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Массовое создание заметок"""
+    rows = [
+        {"title": item.title, "content": item.content, "owner_id": current_user.id}
+        for item in payload.items
+    ]
+    stmt = insert(Note).returning(*BULK_NOTE_COLUMNS, sort_by_parameter_order=True)
+    result = await session.execute(stmt, rows)
+    created = result.all()
+    await session.commit()
+    await invalidate_notes_cache(current_user.id)
+    return [
+        NoteBulkResult(index=index, id=row.id, status="created", note=note_row_out(row))
+        for index, row in enumerate(created)
+    ]
+
+@router.patch(
+    "/bulk",
+    response_model=list[NoteBulkResult],
+    summary="Массовое обновление заметок",
+    description="""
+    Частично обновляет несколько заметок текущего пользователя одним запросом
+    UPDATE ... FROM (VALUES ...) RETURNING.
+    
+    Особенности:
+    - Не переданные поля остаются без изменений
+    - Чужие и несуществующие заметки получают статус not_found
+    - ID в запросе не должны повторяться
+    """,
+    responses={
+        200: {
+            "description": "Результаты обновления",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "index": 0,
+                            "id": 1,
+                            "status": "updated",
+                            "note": {"id": 1, "title": "Новый заголовок", "content": "Текст", "owner_id": 1}
+                        },
+                        {"index": 1, "id": 42, "status": "not_found", "note": None}
+                    ]
+                }
+            }
+        },
+        400: {
+            "description": "Повторяющиеся ID заметок",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Duplicate note ids in request"}
+                }
+            }
+        }
+    }
+)
+async def bulk_update_notes(payload: NoteBulkUpdate, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Массовое обновление заметок"""
+    ids = [item.id for item in payload.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate note ids in request")
+
+    if is_postgres(session):
+        changes = values(
+            column("id", Integer), column("title", String), column("content", String),
+            name="changes"
+        ).data([(item.id, item.title, item.content) for item in payload.items])
+        stmt = (
+            update(Note)
+            .where(Note.id == changes.c.id, Note.owner_id == current_user.id)
+            .values(
+                title=func.coalesce(changes.c.title, Note.title),
+                content=func.coalesce(changes.c.content, Note.content),
+                version=Note.version + 1
+            )
+            .returning(*BULK_NOTE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        updated = {row.id: row for row in (await session.execute(stmt)).all()}
+    else:
+        # SQLite не поддерживает VALUES с именованными колонками: по запросу на заметку в одной транзакции
+        updated = {}
+        for item in payload.items:
+            changes = item.model_dump(exclude={"id"}, exclude_none=True)
+            if not changes:
+                stmt = select(*BULK_NOTE_COLUMNS).where(Note.id == item.id, Note.owner_id == current_user.id)
+            else:
+                stmt = (
+                    update(Note)
+                    .where(Note.id == item.id, Note.owner_id == current_user.id)
+                    .values(**changes, version=Note.version + 1)
+                    .returning(*BULK_NOTE_COLUMNS)
+                    .execution_options(synchronize_session=False)
+                )
+            row = (await session.execute(stmt)).first()
+            if row is not None:
+                updated[row.id] = row
+    await session.commit()
+    await invalidate_notes_cache(current_user.id)
+
+    return [
+        NoteBulkResult(index=index, id=note_id, status="updated", note=note_row_out(updated[note_id]))
+        if note_id in updated
+        else NoteBulkResult(index=index, id=note_id, status="not_found")
+        for index, note_id in enumerate(ids)
+    ]
+
+@router.delete(
+    "/bulk",
+    response_model=list[NoteBulkResult],
+    summary="Массовое удаление заметок",
+    description="""
+    Удаляет несколько заметок текущего пользователя одним запросом DELETE ... RETURNING.
+    
+    Чужие и несуществующие заметки получают статус not_found.
+    """,
+    responses={
+        200: {
+            "description": "Результаты удаления",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {"index": 0, "id": 1, "status": "deleted", "note": None},
+                        {"index": 1, "id": 42, "status": "not_found", "note": None}
+                    ]
+                }
+            }
+        }
+    }
+)
+async def bulk_delete_notes(payload: NoteBulkDelete, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Массовое удаление заметок"""
+    stmt = (
+        delete(Note)
+        .where(Note.owner_id == current_user.id, Note.id.in_(payload.ids))
+        .returning(Note.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = set((await session.execute(stmt)).scalars().all())
+    await session.commit()
+    await invalidate_notes_cache(current_user.id)
+    return [
+        NoteBulkResult(index=index, id=note_id, status="deleted" if note_id in deleted else "not_found")
+        for index, note_id in enumerate(payload.ids)
+    ]
+
+EXPORT_FIELDS = ("id", "title", "content", "owner_id")
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+def encode_export_chunk(notes, format: str, header: bool = False) -> str:
+    if format == "ndjson":
+        return "".join(
+            json.dumps({field: getattr(note, field) for field in EXPORT_FIELDS}, ensure_ascii=False) + "\n"
+            for note in notes
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows([getattr(note, field) for field in EXPORT_FIELDS] for note in notes)
+    return buffer.getvalue()
+
+async def stream_notes_export(request: Request, owner_id: int, format: str):
+    # Сессия из зависимости закрывается до начала стриминга, поэтому открываем свою
+    stmt = (
+        select(Note)
+        .where(Note.owner_id == owner_id)
+        .order_by(Note.owner_id, Note.id)
+        .execution_options(yield_per=settings.NOTES_EXPORT_CHUNK_SIZE)
+    )
+    async with session_factory() as session:
+        result = await session.stream_scalars(stmt)
+        first = True
+        async for notes in result.partitions():
+            if await request.is_disconnected():
+                break
+            yield encode_export_chunk(notes, format, header=first)
+            first = False
+        if first and format == "csv":
+            yield encode_export_chunk([], format, header=True)
+
+@router.get(
+    "/export",
+    summary="Экспорт всех заметок",
+    description="""
+    Выгружает все заметки текущего пользователя потоком.
+    
+    Форматы:
+    - ndjson: по одному JSON-объекту на строку (по умолчанию)
+    - csv: с заголовком id,title,content,owner_id
+    
+    Заметки читаются серверным курсором порциями по NOTES_EXPORT_CHUNK_SIZE,
+    поэтому потребление памяти не зависит от количества заметок.
+    Выгрузка прекращается, если клиент отключился.
+    """,
+    responses={
+        200: {
+            "description": "Поток заметок",
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"id": 1, "title": "Моя заметка", "content": "Содержимое", "owner_id": 1}\n'
+                },
+                "text/csv": {
+                    "example": "id,title,content,owner_id\r\n1,Моя заметка,Содержимое,1\r\n"
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def export_notes(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Формат выгрузки: ndjson или csv")
+    ):
+    """Потоковая выгрузка заметок в NDJSON или CSV"""
+    return StreamingResponse(
+        stream_notes_export(request, current_user.id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="notes.{format}"'}
+    )
+
+class NoteImporter:
+    """Построчный разбор NDJSON с пакетной вставкой"""
+
+    def __init__(self, session, owner_id: int):
+        self.session = session
+        self.owner_id = owner_id
+        self.batch: list[dict] = []
+        self.accepted = 0
+        self.rejected = 0
+        self.errors: list[NoteImportError] = []
+        self.line_no = 0
+
+    def reject(self, error: str):
+        self.rejected += 1
+        if len(self.errors) < settings.NOTES_IMPORT_MAX_ERRORS:
+            self.errors.append(NoteImportError(line=self.line_no, error=error))
+
+    async def feed_line(self, line: bytes):
+        self.line_no += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            note = NoteCreate.model_validate_json(line)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            self.reject(f"{location}: {error['msg']}" if location else error["msg"])
+            return
+        self.batch.append({"title": note.title, "content": note.content, "owner_id": self.owner_id})
+        if len(self.batch) >= settings.NOTES_IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self.batch:
+            return
+        # executemany: SQLAlchemy собирает пакет в многострочные INSERT ... VALUES
+        await self.session.execute(insert(Note), self.batch)
+        await self.session.commit()
+        await invalidate_notes_cache(self.owner_id)
+        self.accepted += len(self.batch)
+        self.batch = []
+
+    def result(self) -> NoteImportResult:
+        return NoteImportResult(accepted=self.accepted, rejected=self.rejected, errors=self.errors)
+
+@router.post(
+    "/import",
+    response_model=NoteImportResult,
+    summary="Импорт заметок из NDJSON",
+    description="""
+    Импортирует заметки из тела запроса в формате NDJSON
+    (одна заметка {"title": ..., "content": ...} на строку).
+    
+    Особенности:
+    - Тело читается потоком, каждая строка валидируется как при обычном создании
+    - Заметки вставляются пакетами по NOTES_IMPORT_BATCH_SIZE, каждый пакет фиксируется отдельно
+    - Следующая часть тела читается только после записи пакета (backpressure)
+    - Некорректные строки и строки длиннее NOTES_IMPORT_MAX_LINE_BYTES пропускаются
+    
+    Возвращает количество принятых и отклоненных строк и первые ошибки.
+    """,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": '{"title": "Первая", "content": "Текст"}\n{"title": "Вторая", "content": "Текст"}\n'
+                }
+            }
+        }
+    },
+    responses={
+        200: {
+            "description": "Итог импорта",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "accepted": 2,
+                        "rejected": 1,
+                        "errors": [{"line": 2, "error": "title: Field required"}]
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def import_notes(request: Request, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Потоковый импорт заметок из NDJSON"""
+    importer = NoteImporter(session, current_user.id)
+    buffer = b""
+    skipping = False
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                # Хвост слишком длинной строки, которая уже учтена как отклоненная
+                skipping = False
+                continue
+            if len(line) > settings.NOTES_IMPORT_MAX_LINE_BYTES:
+                importer.line_no += 1
+                importer.reject("Line is too long")
+                continue
+            await importer.feed_line(line)
+        if not skipping and len(buffer) > settings.NOTES_IMPORT_MAX_LINE_BYTES:
+            importer.line_no += 1
+            importer.reject("Line is too long")
+            buffer = b""
+            skipping = True
+        elif skipping:
+            buffer = b""
+    if buffer and not skipping:
+        await importer.feed_line(buffer)
+    await importer.flush()
+    return importer.result()
+
 @router.get(
     "/{note_id}", 
     response_model=NoteOut,
@@ -156,6 +778,13 @@ async def list_notes(
     
     Параметры:
     - note_id: уникальный идентификатор заметки
+    
+    Выбор полей:
+    - fields: список полей через запятую (например, `fields=id,title`)
+    
+    Условные запросы:
+    - Ответ содержит заголовок ETag с версией заметки
+    - При совпадении If-None-Match возвращается 304 без тела
     """,
     responses={
         200: {
@@ -171,6 +800,9 @@ async def list_notes(
                 }
             }
         },
+        304: {
+            "description": "Заметка не изменилась (совпал If-None-Match)"
+        },
         404: {
             "description": "Заметка не найдена или доступ запрещен",
             "content": {
@@ -189,13 +821,42 @@ async def list_notes(
         }
     }
 )
-async def get_note(note_id: int, session: SessionDep, current_user: User = Depends(get_current_user)):
+async def get_note(
+    note_id: int,
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    current_user: User = Depends(get_current_user),
+    fields: Optional[str] = Query(None, description="Возвращаемые поля через запятую, например id,title")
+    ):
     """Получение заметки по ID с проверкой владельца"""
+    selected = parse_note_fields(fields)
+    if request.headers.get("if-none-match"):
+        # Для проверки ETag достаточно версии, без чтения всей строки
+        stmt = select(Note.version).where(Note.id == note_id, Note.owner_id == current_user.id)
+        version = (await session.execute(stmt)).scalar_one_or_none()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Note not found or access denied")
+        etag = note_etag(note_id, version, selected)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+    if selected:
+        stmt = select(*note_columns(selected)).where(Note.id == note_id, Note.owner_id == current_user.id)
+        row = (await session.execute(stmt)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Note not found or access denied")
+        return JSONResponse(
+            content={field: getattr(row, field) for field in selected},
+            headers={"ETag": note_etag(row.id, row.version, selected)}
+        )
+
     stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
     result = await session.execute(stmt)
     note = result.scalars().first()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
+    response.headers["ETag"] = note_etag(note.id, note.version)
     return note
 
 @router.put(
@@ -264,18 +925,22 @@ async def get_note(note_id: int, session: SessionDep, current_user: User = Depen
 )
 async def update_note(note_id: int, note: NoteUpdate, session: SessionDep, current_user: User = Depends(get_current_user)):
     """Обновление заметки с проверкой владельца"""
-    stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
+    changes = note.model_dump(exclude_none=True)
+    if changes:
+        stmt = (
+            update(Note)
+            .where(Note.id == note_id, Note.owner_id == current_user.id)
+            .values(**changes, version=Note.version + 1)
+            .returning(Note)
+        )
+    else:
+        stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
     result = await session.execute(stmt)
     db_note = result.scalars().first()
     if not db_note:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
-    if note.title is not None:
-        db_note.title = note.title
-    if note.content is not None:
-        db_note.content = note.content
-    session.add(db_note)
     await session.commit()
-    await session.refresh(db_note)
+    await invalidate_notes_cache(current_user.id)
     return db_note
 
 @router.delete(
@@ -322,11 +987,15 @@ async def update_note(note_id: int, note: NoteUpdate, session: SessionDep, curre
 )
 async def delete_note(note_id: int, session: SessionDep, current_user: User = Depends(get_current_user)):
     """Удаление заметки с проверкой владельца"""
-    stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
+    stmt = (
+        delete(Note)
+        .where(Note.id == note_id, Note.owner_id == current_user.id)
+        .returning(Note.id)
+        .execution_options(synchronize_session=False)
+    )
     result = await session.execute(stmt)
-    note = result.scalars().first()
-    if not note:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
-    session.delete(note)
     await session.commit()
+    await invalidate_notes_cache(current_user.id)
     return {"detail": "Note deleted"}
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Сравнение кодеков кэша на списках NoteOut.
+
+Запуск из каталога проекта:
+    python -m tests.bench_cache_codecs
+"""
+import random
+import string
+import time
+from fastapi.encoders import jsonable_encoder
+from config.cache_codecs import CODECS, CacheSerializer, zstandard, lz4_frame
+from models import NoteOut
+
+ROUNDS = 200
+PAGE_SIZES = (10, 100, 1000)
+
+
+def make_page(size: int) -> list[NoteOut]:
+    rng = random.Random(size)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(500)]
+    return [
+        NoteOut(
+            id=index,
+            title=" ".join(rng.choices(words, k=rng.randint(2, 8))),
+            content=" ".join(rng.choices(words, k=rng.randint(20, 200))),
+            owner_id=rng.randint(1, 50)
+        )
+        for index in range(1, size + 1)
+    ]
+
+
+def bench(serializer: CacheSerializer, value) -> tuple[float, float, int]:
+    data = serializer.dumps(value)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        serializer.dumps(value)
+    encode = (time.perf_counter() - start) / ROUNDS
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        serializer.loads(data)
+    decode = (time.perf_counter() - start) / ROUNDS
+    return encode, decode, len(data)
+
+
+def main():
+    compressions = ["none"]
+    if zstandard is not None:
+        compressions.append("zstd")
+    if lz4_frame is not None:
+        compressions.append("lz4")
+
+    print(f"{'notes':>6} {'codec':>8} {'compress':>8} {'encode us':>10} {'decode us':>10} {'bytes':>9}")
+    for size in PAGE_SIZES:
+        page = make_page(size)
+        for codec in CODECS:
+            for compression in compressions:
+                try:
+                    serializer = CacheSerializer(codec=codec, compression=compression, compress_min_bytes=0)
+                except RuntimeError as e:
+                    print(f"{size:>6} {codec:>8} {compression:>8} skipped: {e}")
+                    continue
+                value = jsonable_encoder(page) if serializer.json_only else page
+                encode, decode, stored = bench(serializer, value)
+                print(f"{size:>6} {codec:>8} {compression:>8} {encode * 1e6:>10.1f} {decode * 1e6:>10.1f} {stored:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Сравнение пропускной способности стеков middleware:
+BaseHTTPMiddleware (как было раньше) и чистые ASGI-middleware.
+
+Нужны запущенные Postgres и Redis из .env. Запуск из каталога проекта:
+    python -m tests.bench_middleware
+"""
+import asyncio
+import logging
+import time
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from config.settings import settings, RateLimitPolicy
+from config.middleware import RateLimiterMiddleware, RequestLoggingMiddleware, logger
+from metadata import lifespan
+from index import health
+from notes import router as notes_router
+from users import router as users_router
+
+REQUESTS = 2000
+CONCURRENCY = 50
+
+
+class LegacyRateLimiterMiddleware(BaseHTTPMiddleware):
+    """Та же логика лимита, но через BaseHTTPMiddleware"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.limiter = RateLimiterMiddleware(app)
+
+    async def dispatch(self, request: Request, call_next):
+        decision = await self.limiter.acquire(self.limiter.buckets(request.scope))
+        response = await call_next(request)
+        response.headers.update(self.limiter.rate_limit_headers(decision))
+        return response
+
+
+async def legacy_log_requests(request: Request, call_next):
+    logger.info({"event": "request", "method": request.method, "url": str(request.url)})
+    response = await call_next(request)
+    logger.info({"event": "response", "status_code": response.status_code})
+    return response
+
+
+def make_app(pure: bool) -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.get("/health")(health)
+    app.include_router(users_router)
+    app.include_router(notes_router)
+    if pure:
+        app.add_middleware(RateLimiterMiddleware)
+        app.add_middleware(RequestLoggingMiddleware)
+    else:
+        app.add_middleware(LegacyRateLimiterMiddleware)
+        app.middleware("http")(legacy_log_requests)
+    return app
+
+
+async def run(client: httpx.AsyncClient, path: str, headers: dict) -> float:
+    queue = asyncio.Queue()
+    for _ in range(REQUESTS):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return REQUESTS / (time.perf_counter() - start)
+
+
+async def bench(pure: bool) -> dict:
+    app = make_app(pure)
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            credentials = {"username": "bench_user", "password": "bench_password"}
+            await client.post("/users/register/", json=credentials)
+            token = (await client.post("/users/login/", json=credentials)).json()["access_token"]
+            auth = {"Authorization": f"Bearer {token}"}
+            await client.post("/notes/", json={"title": "bench", "content": "bench"}, headers=auth)
+            return {
+                "/health": await run(client, "/health", {}),
+                "/notes/": await run(client, "/notes/", auth),
+            }
+
+
+async def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    # Бенчмарк меряет накладные расходы middleware, а не срабатывание лимита
+    settings.RATE_LIMIT_POLICIES = [RateLimitPolicy(name="bench", key="sub", limit=10 ** 9, window=60)]
+    results = {"BaseHTTPMiddleware": await bench(pure=False), "pure ASGI": await bench(pure=True)}
+    print(f"{'stack':>20} {'path':>10} {'req/s':>10}")
+    for stack, paths in results.items():
+        for path, rps in paths.items():
+            print(f"{stack:>20} {path:>10} {rps:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
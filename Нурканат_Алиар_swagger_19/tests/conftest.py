@@ -1,28 +1,61 @@
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlmodel.pool import StaticPool
+import metadata
+import notes
+import config.middleware
+import config.redis_cache
 from index import app
-from metadata import SessionDep, get_db
+from metadata import get_db
+from config.redis_cache import redis_cache
+from config.token_cache import token_cache
+from config.token_versions import token_versions
 
-@pytest.fixture(name="client")
-def client_fixture():
-    engine = create_engine(
-        "sqlite:///:memory:",
+@pytest.fixture(name="redis_server")
+def redis_server_fixture(monkeypatch):
+    """Отдельный fakeredis на каждый тест: кэш, теги и лимиты не переживают тест"""
+    server = fakeredis.FakeServer()
+
+    def from_url(url, **kwargs):
+        return fakeredis.FakeAsyncRedis(server=server)
+
+    monkeypatch.setattr(config.redis_cache, "from_url", from_url)
+    monkeypatch.setattr(config.middleware, "from_url", from_url)
+    return server
+
+@pytest.fixture(name="session_factory")
+def session_factory_fixture(monkeypatch):
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
         connect_args={"check_same_thread": False},
         poolclass=StaticPool
     )
-    SQLModel.metadata.create_all(engine)
-    
-    def get_db_override():
-        with Session(engine) as session:
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+    # lifespan создает таблицы через metadata.engine, экспорт открывает сессии сам
+    monkeypatch.setattr(metadata, "engine", engine)
+    monkeypatch.setattr(notes, "session_factory", factory)
+    return factory
+
+@pytest.fixture(name="client")
+def client_fixture(redis_server, session_factory):
+    async def get_db_override():
+        async with session_factory() as session:
             yield session
-    
+
     app.dependency_overrides[get_db] = get_db_override
-    
-    client = TestClient(app)
-    yield client
+    # Middleware держат клиентов Redis: стек пересобирается для каждого теста
+    app.middleware_stack = None
+    token_cache.clear()
+    token_versions.clear()
+    if redis_cache.local is not None:
+        redis_cache.local.clear()
+
+    with TestClient(app) as client:
+        yield client
     app.dependency_overrides.clear()
+    app.middleware_stack = None
 
 @pytest.fixture
 def test_user(client):
@@ -44,12 +77,7 @@ def auth_headers(client, test_user):
         "username": "testuser",
         "password": "testpass"
     }
-    response = client.post(
-        "/users/login/",
-        data=login_data,
-        headers={"Content-Type": "application/x-www-form-urlencoded"}
-    )
-    print(response.json())  # Для отладки
+    response = client.post("/users/login/", json=login_data)
     assert response.status_code == 200
     token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
\ No newline at end of file
+    return {"Authorization": f"Bearer {token}"}
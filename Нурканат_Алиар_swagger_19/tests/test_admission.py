@@ -0,0 +1,53 @@
+from config.admission import AdaptiveLimit, admission_limit
+from config.settings import settings
+
+def make_limit(limit: float = 100) -> AdaptiveLimit:
+    adaptive = AdaptiveLimit()
+    adaptive.limit = limit
+    return adaptive
+
+def test_adjust_shrinks_on_loop_lag():
+    adaptive = make_limit()
+    adaptive._peak_loop_lag = adaptive.max_loop_lag * 2
+    adaptive._adjust()
+    assert adaptive.limit == 90
+
+def test_adjust_shrinks_on_latency():
+    adaptive = make_limit()
+    adaptive.release(adaptive.target_latency * 2)
+    adaptive.in_flight = 0
+    adaptive._adjust()
+    assert adaptive.limit == 90
+
+def test_adjust_grows_only_when_limit_is_used():
+    adaptive = make_limit()
+    adaptive._adjust()
+    assert adaptive.limit == 100
+
+    adaptive._peak_in_flight = 80
+    adaptive._adjust()
+    assert adaptive.limit == 101
+
+def test_adjust_stays_within_bounds():
+    adaptive = make_limit(settings.ADMISSION_MIN_LIMIT)
+    adaptive._peak_loop_lag = adaptive.max_loop_lag * 2
+    adaptive._adjust()
+    assert adaptive.limit == settings.ADMISSION_MIN_LIMIT
+
+    adaptive = make_limit(settings.ADMISSION_MAX_LIMIT)
+    adaptive._peak_in_flight = settings.ADMISSION_MAX_LIMIT
+    adaptive._adjust()
+    assert adaptive.limit == settings.ADMISSION_MAX_LIMIT
+
+def test_exempt_paths_pass_when_overloaded(client, monkeypatch):
+    monkeypatch.setattr(admission_limit, "in_flight", int(admission_limit.limit))
+
+    response = client.get("/notes/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/health").status_code == 200
+    assert client.get("/metrics").status_code == 200
+
+def test_monitor_follows_lifespan(client):
+    # Монитор запущен lifespan, а не первым запросом
+    assert admission_limit._monitor is not None and not admission_limit._monitor.done()
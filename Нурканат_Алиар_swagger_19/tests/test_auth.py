@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 import pytest
+from config.hashing import password_hasher
 
 def test_register_user(client):
     response = client.post(
@@ -18,3 +19,9 @@ def test_login_user(client):
     )
     print(login_response.json())  
     assert login_response.status_code == 422
+
+def test_login_rejected_when_hashing_pool_is_full(client, test_user, monkeypatch):
+    monkeypatch.setattr(password_hasher, "_pending", password_hasher.pool_size + password_hasher.queue_size)
+    response = client.post("/users/login/", json={"username": "testuser", "password": "testpass"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,73 @@
+import base64
+
+def create_notes(client, headers, count):
+    for i in range(count):
+        response = client.post("/notes/", json={"title": f"note {i}", "content": f"content {i}"}, headers=headers)
+        assert response.status_code == 201
+
+def test_list_notes_cursor_pagination(client, auth_headers):
+    create_notes(client, auth_headers, 5)
+
+    first = client.get("/notes/?limit=2", headers=auth_headers)
+    assert first.status_code == 200
+    assert [note["title"] for note in first.json()] == ["note 0", "note 1"]
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get(f"/notes/?limit=2&cursor={cursor}", headers=auth_headers)
+    assert [note["title"] for note in second.json()] == ["note 2", "note 3"]
+
+    last = client.get(f"/notes/?limit=2&cursor={second.headers['X-Next-Cursor']}", headers=auth_headers)
+    assert [note["title"] for note in last.json()] == ["note 4"]
+    assert "X-Next-Cursor" not in last.headers
+
+def test_list_notes_invalid_cursor(client, auth_headers):
+    response = client.get("/notes/?cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+def test_list_notes_cursor_out_of_range(client, auth_headers):
+    for value in ("9" * 30, "-1"):
+        cursor = base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+        response = client.get(f"/notes/?cursor={cursor}", headers=auth_headers)
+        assert response.status_code == 400
+
+def test_list_notes_etag_not_modified(client, auth_headers):
+    create_notes(client, auth_headers, 2)
+    response = client.get("/notes/", headers=auth_headers)
+    etag = response.headers["ETag"]
+
+    not_modified = client.get("/notes/", headers={**auth_headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    client.put("/notes/1", json={"title": "changed"}, headers=auth_headers)
+    changed = client.get("/notes/", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["title"] == "changed"
+
+def test_get_note_etag_not_modified(client, auth_headers):
+    create_notes(client, auth_headers, 1)
+    response = client.get("/notes/1", headers=auth_headers)
+    etag = response.headers["ETag"]
+
+    assert client.get("/notes/1", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    client.put("/notes/1", json={"content": "changed"}, headers=auth_headers)
+    changed = client.get("/notes/1", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["content"] == "changed"
+
+def test_notes_sparse_fields(client, auth_headers):
+    create_notes(client, auth_headers, 2)
+
+    notes = client.get("/notes/?fields=title", headers=auth_headers)
+    assert notes.json() == [{"title": "note 0"}, {"title": "note 1"}]
+
+    note = client.get("/notes/1?fields=id,title", headers=auth_headers)
+    assert note.json() == {"id": 1, "title": "note 0"}
+    # ETag зависит от набора полей: частичный ответ не подменяет полный
+    assert note.headers["ETag"] != client.get("/notes/1", headers=auth_headers).headers["ETag"]
+
+def test_notes_unknown_field(client, auth_headers):
+    response = client.get("/notes/?fields=title,password", headers=auth_headers)
+    assert response.status_code == 400
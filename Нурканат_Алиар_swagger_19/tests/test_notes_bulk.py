@@ -0,0 +1,63 @@
+from config.settings import settings
+
+def other_user_headers(client):
+    credentials = {"username": "otheruser", "password": "otherpass"}
+    client.post("/users/register/", json=credentials)
+    token = client.post("/users/login/", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def bulk_create(client, headers, titles):
+    response = client.post(
+        "/notes/bulk",
+        json={"items": [{"title": title, "content": f"{title} content"} for title in titles]},
+        headers=headers
+    )
+    assert response.status_code == 201
+    return response.json()
+
+def test_bulk_create_returns_items_in_order(client, auth_headers):
+    created = bulk_create(client, auth_headers, ["a", "b", "c"])
+    assert [(item["index"], item["status"], item["note"]["title"]) for item in created] == [
+        (0, "created", "a"), (1, "created", "b"), (2, "created", "c")
+    ]
+    assert len(client.get("/notes/", headers=auth_headers).json()) == 3
+
+def test_bulk_update_partial_and_foreign_ids(client, auth_headers):
+    own = bulk_create(client, auth_headers, ["mine"])[0]["id"]
+    foreign = bulk_create(client, other_user_headers(client), ["theirs"])[0]["id"]
+
+    response = client.patch(
+        "/notes/bulk",
+        json={"items": [{"id": own, "title": "renamed"}, {"id": foreign, "title": "stolen"}, {"id": 999, "content": "x"}]},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [item["status"] for item in results] == ["updated", "not_found", "not_found"]
+    # Не переданное поле остается прежним
+    assert results[0]["note"] == {"id": own, "title": "renamed", "content": "mine content", "owner_id": 1}
+
+def test_bulk_update_rejects_duplicate_ids(client, auth_headers):
+    note_id = bulk_create(client, auth_headers, ["a"])[0]["id"]
+    response = client.patch(
+        "/notes/bulk",
+        json={"items": [{"id": note_id, "title": "x"}, {"id": note_id, "title": "y"}]},
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+
+def test_bulk_delete_skips_foreign_ids(client, auth_headers):
+    own = bulk_create(client, auth_headers, ["mine"])[0]["id"]
+    other_headers = other_user_headers(client)
+    foreign = bulk_create(client, other_headers, ["theirs"])[0]["id"]
+
+    response = client.request("DELETE", "/notes/bulk", json={"ids": [own, foreign]}, headers=auth_headers)
+    assert [item["status"] for item in response.json()] == ["deleted", "not_found"]
+    assert client.get("/notes/", headers=auth_headers).json() == []
+    assert len(client.get("/notes/", headers=other_headers).json()) == 1
+
+def test_bulk_max_items(client, auth_headers):
+    items = [{"title": "t", "content": "c"}] * (settings.NOTES_BULK_MAX_ITEMS + 1)
+    assert client.post("/notes/bulk", json={"items": items}, headers=auth_headers).status_code == 422
+    ids = list(range(1, settings.NOTES_BULK_MAX_ITEMS + 2))
+    assert client.request("DELETE", "/notes/bulk", json={"ids": ids}, headers=auth_headers).status_code == 422
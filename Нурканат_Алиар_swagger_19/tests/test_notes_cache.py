@@ -0,0 +1,64 @@
+import httpx
+from starlette.responses import JSONResponse
+from config.redis_cache import redis_cache, STALE_AGE_HEADER
+from config.response_cache import ResponseCacheMiddleware, CacheRule
+
+def redis_ttls(client, pattern):
+    async def ttls():
+        return {key.decode(): await redis_cache.redis.ttl(key) async for key in redis_cache.redis.scan_iter(pattern)}
+    return client.portal.call(ttls)
+
+def test_list_reflects_writes(client, auth_headers):
+    client.post("/notes/", json={"title": "first", "content": "c"}, headers=auth_headers)
+    assert client.get("/notes/", headers=auth_headers).headers["X-Cache"] == "MISS"
+    assert client.get("/notes/", headers=auth_headers).headers["X-Cache"] == "HIT"
+
+    client.put("/notes/1", json={"title": "renamed"}, headers=auth_headers)
+    response = client.get("/notes/", headers=auth_headers)
+    assert response.headers["X-Cache"] == "MISS"
+    assert [note["title"] for note in response.json()] == ["renamed"]
+
+    client.post("/notes/", json={"title": "second", "content": "c"}, headers=auth_headers)
+    assert len(client.get("/notes/", headers=auth_headers).json()) == 2
+
+    client.delete("/notes/1", headers=auth_headers)
+    assert [note["title"] for note in client.get("/notes/", headers=auth_headers).json()] == ["second"]
+
+def test_tag_set_outlives_both_caches(client, auth_headers):
+    client.post("/notes/", json={"title": "old", "content": "c"}, headers=auth_headers)
+    client.get("/notes/", headers=auth_headers)
+
+    # Ответный кэш (30 с) не должен укорачивать тег записи list_notes (ttl + stale_ttl)
+    tag_ttl = redis_ttls(client, "cache:tag:user:1:notes")["cache:tag:user:1:notes"]
+    entry_ttls = redis_ttls(client, "notes:list_notes:*") | redis_ttls(client, "response:*")
+    assert entry_ttls and tag_ttl >= max(entry_ttls.values())
+
+    client.put("/notes/1", json={"title": "new"}, headers=auth_headers)
+    assert redis_ttls(client, "notes:list_notes:*") == {}
+    assert redis_ttls(client, "response:*") == {}
+    assert client.get("/notes/", headers=auth_headers).json()[0]["title"] == "new"
+
+def test_writes_succeed_when_redis_is_down(client, auth_headers, redis_server):
+    redis_server.connected = False
+
+    created = client.post("/notes/", json={"title": "saved", "content": "c"}, headers=auth_headers)
+    assert created.status_code == 201
+    assert client.put("/notes/1", json={"title": "updated"}, headers=auth_headers).status_code == 200
+
+    response = client.get("/notes/", headers=auth_headers)
+    assert response.status_code == 200
+    assert [note["title"] for note in response.json()] == ["updated"]
+
+def test_stale_responses_are_not_stored(client, auth_headers):
+    async def stale_endpoint(scope, receive, send):
+        response = JSONResponse({"value": 1}, headers={STALE_AGE_HEADER: "12"})
+        await response(scope, receive, send)
+
+    middleware = ResponseCacheMiddleware(stale_endpoint, rules=[CacheRule(path=r"/stale", tags=["user:{uid}:notes"])])
+
+    async def get_twice():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return [(await http.get("/stale", headers=auth_headers)).headers["X-Cache"] for _ in range(2)]
+
+    assert client.portal.call(get_twice) == ["MISS", "MISS"]
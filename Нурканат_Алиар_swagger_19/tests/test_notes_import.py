@@ -0,0 +1,57 @@
+import json
+import httpx
+from config.settings import settings
+from index import app
+
+def import_chunks(client, headers, chunks):
+    """Отправляет тело по частям: TestClient склеивает его в один кусок"""
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+            return await http.post("/notes/import", content=body(), headers=headers)
+
+    response = client.portal.call(send)
+    assert response.status_code == 200
+    return response.json()
+
+def ndjson_line(title):
+    return json.dumps({"title": title, "content": f"{title} content"}).encode() + b"\n"
+
+def titles(client, headers):
+    return [note["title"] for note in client.get("/notes/?limit=100", headers=headers).json()]
+
+def test_import_line_split_across_chunks(client, auth_headers):
+    line = ndjson_line("split")
+    result = import_chunks(client, auth_headers, [ndjson_line("first") + line[:7], line[7:]])
+    assert result == {"accepted": 2, "rejected": 0, "errors": []}
+    assert titles(client, auth_headers) == ["first", "split"]
+
+def test_import_overlong_line_then_valid(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "NOTES_IMPORT_MAX_LINE_BYTES", 64)
+    long_line = json.dumps({"title": "long", "content": "x" * 200}).encode() + b"\n"
+    # Длинная строка приходит в нескольких частях, последняя часть несет и следующую строку
+    chunks = [long_line[:80], long_line[80:160], long_line[160:] + ndjson_line("after")]
+    result = import_chunks(client, auth_headers, chunks)
+    assert result == {"accepted": 1, "rejected": 1, "errors": [{"line": 1, "error": "Line is too long"}]}
+    assert titles(client, auth_headers) == ["after"]
+
+def test_import_invalid_json(client, auth_headers):
+    result = import_chunks(client, auth_headers, [b"{not json}\n", b'{"content": "no title"}\n', ndjson_line("ok")])
+    assert result["accepted"] == 1
+    assert result["rejected"] == 2
+    assert [error["line"] for error in result["errors"]] == [1, 2]
+    assert result["errors"][1]["error"].startswith("title:")
+
+def test_import_counts_across_batches(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "NOTES_IMPORT_BATCH_SIZE", 2)
+    lines = [ndjson_line(f"note {i}") for i in range(5)]
+    lines.insert(3, b"garbage\n")
+    result = import_chunks(client, auth_headers, lines)
+    assert result["accepted"] == 5
+    assert result["rejected"] == 1
+    assert [error["line"] for error in result["errors"]] == [4]
+    assert titles(client, auth_headers) == [f"note {i}" for i in range(5)]
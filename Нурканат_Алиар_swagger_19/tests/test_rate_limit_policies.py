@@ -0,0 +1,19 @@
+from config.settings import RateLimitPolicy
+from config.middleware import CompiledPolicy
+
+def test_policy_matches_route_and_method():
+    policy = CompiledPolicy(RateLimitPolicy(name="auth", path=r"/users/(login|register)/", methods=["post"], limit=10, window=60))
+    assert policy.matches("POST", "/users/login/", None)
+    assert not policy.matches("GET", "/users/login/", None)
+    assert not policy.matches("POST", "/users/me/", None)
+
+def test_policy_cost_weights():
+    policy = CompiledPolicy(RateLimitPolicy(name="default", limit=100, window=60, costs={r"/notes/(import|export)": 10}))
+    assert policy.cost("/notes/export") == 10
+    assert policy.cost("/notes/") == 1
+
+def test_policy_bucket_key_falls_back_to_ip():
+    policy = CompiledPolicy(RateLimitPolicy(name="default", key="sub", limit=100, window=60))
+    principal = {"uid": 1, "sub": "alice", "role": "user", "ver": 0}
+    assert policy.bucket_key("10.0.0.1", principal) == "rate_limit:default:sub:alice"
+    assert policy.bucket_key("10.0.0.1", None) == "rate_limit:default:ip:10.0.0.1"
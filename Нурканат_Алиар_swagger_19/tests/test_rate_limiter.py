@@ -0,0 +1,143 @@
+import fakeredis
+import pytest
+from config.settings import settings
+from config.middleware import RateLimiterMiddleware, Bucket, GCRA_SCRIPT, GCRA_REFUND_SCRIPT
+
+def make_limiter(monkeypatch, mode: str = "redis") -> RateLimiterMiddleware:
+    monkeypatch.setattr(settings, "RATE_LIMIT_MODE", mode)
+    limiter = RateLimiterMiddleware(app=None)
+    limiter.redis = fakeredis.FakeAsyncRedis()
+    limiter.script = limiter.redis.register_script(GCRA_SCRIPT)
+    limiter.refund_script = limiter.redis.register_script(GCRA_REFUND_SCRIPT)
+    return limiter
+
+@pytest.mark.asyncio
+async def test_allows_up_to_limit_then_denies(monkeypatch):
+    limiter = make_limiter(monkeypatch)
+    bucket = Bucket("rate_limit:test:ip:1", limit=3, window=60, cost=1)
+
+    decisions = [await limiter.acquire([bucket]) for _ in range(4)]
+    assert [decision.allowed for decision in decisions] == [True, True, True, False]
+    assert [decision.remaining for decision in decisions[:3]] == [2, 1, 0]
+    # Один токен восстанавливается за window / limit = 20 секунд
+    assert 19000 < decisions[3].retry_after_ms <= 20000
+
+@pytest.mark.asyncio
+async def test_cost_weights(monkeypatch):
+    limiter = make_limiter(monkeypatch)
+    bucket = Bucket("rate_limit:test:ip:1", limit=10, window=60, cost=4)
+
+    first, second, third = [await limiter.acquire([bucket]) for _ in range(3)]
+    assert first.allowed and second.allowed and not third.allowed
+    assert second.remaining == 2
+
+@pytest.mark.asyncio
+async def test_cost_above_limit_takes_whole_bucket(monkeypatch):
+    limiter = make_limiter(monkeypatch)
+    bucket = Bucket("rate_limit:test:ip:1", limit=3, window=60, cost=5)
+
+    first = await limiter.acquire([bucket])
+    second = await limiter.acquire([bucket])
+    assert first.allowed and first.remaining == 0
+    assert not second.allowed
+    assert 59000 < second.retry_after_ms <= 60000
+
+@pytest.mark.asyncio
+async def test_buckets_update_all_or_nothing(monkeypatch):
+    limiter = make_limiter(monkeypatch)
+    wide = Bucket("rate_limit:wide:ip:1", limit=5, window=60, cost=1)
+    narrow = Bucket("rate_limit:narrow:ip:1", limit=1, window=60, cost=1)
+
+    assert (await limiter.acquire([wide, narrow])).allowed
+    denied = await limiter.acquire([wide, narrow])
+    assert not denied.allowed and denied.limit == 1
+    # Отказ по узкому лимиту не списал токен из широкого
+    assert (await limiter.acquire([wide])).remaining == 3
+
+@pytest.mark.asyncio
+async def test_partial_grant(monkeypatch):
+    limiter = make_limiter(monkeypatch)
+    granted, remaining, _, _, _ = await limiter.script(keys=["rate_limit:test:ip:1"], args=[1, 5, 60, 8])
+    assert (granted, remaining) == (5, 0)
+    granted, _, retry_after_ms, _, _ = await limiter.script(keys=["rate_limit:test:ip:1"], args=[1, 5, 60, 8])
+    assert granted == 0 and retry_after_ms > 0
+
+@pytest.mark.asyncio
+async def test_hybrid_lease_serves_from_memory(monkeypatch):
+    limiter = make_limiter(monkeypatch, "hybrid")
+    bucket = Bucket("rate_limit:test:sub:alice", limit=100, window=60, cost=1)
+
+    assert (await limiter.acquire([bucket])).allowed
+    tat = await limiter.redis.get(bucket.key)
+    # Аренда на 10% лимита: следующие 9 запросов не обращаются к Redis
+    for _ in range(9):
+        assert (await limiter.acquire([bucket])).allowed
+    assert await limiter.redis.get(bucket.key) == tat
+    assert (await limiter.acquire([bucket])).allowed
+    assert await limiter.redis.get(bucket.key) != tat
+
+@pytest.mark.asyncio
+async def test_hybrid_partial_lease_accumulates(monkeypatch):
+    limiter = make_limiter(monkeypatch, "hybrid")
+    bucket = Bucket("rate_limit:test:sub:alice", limit=10, window=60, cost=4)
+    await limiter.script(keys=[bucket.key], args=[0, 10, 60, 7])
+
+    # В Redis осталось 3 токена: выдаются частично, запрос ждет
+    assert not (await limiter.acquire([bucket])).allowed
+    assert limiter.leases.held(bucket.key) == 3
+    # Недостающий токен появится через 6 секунд; сдвигаем TAT вместо ожидания
+    tat = float(await limiter.redis.get(bucket.key))
+    await limiter.redis.set(bucket.key, tat - 6000)
+    assert (await limiter.acquire([bucket])).allowed
+    assert limiter.leases.held(bucket.key) == 0
+
+@pytest.mark.asyncio
+async def test_hybrid_sparse_client_keeps_budget(monkeypatch):
+    limiter = make_limiter(monkeypatch, "hybrid")
+    # Каждый запрос приходит уже после истечения аренды
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_TTL", 0)
+    bucket = Bucket("rate_limit:test:sub:alice", limit=100, window=60, cost=1)
+
+    decisions = [await limiter.acquire([bucket]) for _ in range(50)]
+    assert all(decision.allowed for decision in decisions)
+    # Списано 50 запросов и еще 9 токенов в последней аренде, а не по пачке на запрос
+    assert decisions[-1].remaining >= 40
+
+@pytest.mark.asyncio
+async def test_hybrid_buckets_all_or_nothing(monkeypatch):
+    limiter = make_limiter(monkeypatch, "hybrid")
+    wide = Bucket("rate_limit:wide:sub:alice", limit=100, window=60, cost=1)
+    narrow = Bucket("rate_limit:narrow:sub:alice", limit=1, window=60, cost=1)
+
+    assert (await limiter.acquire([wide, narrow])).allowed
+    assert limiter.leases.held(wide.key) == 9
+    assert not (await limiter.acquire([wide, narrow])).allowed
+    # Токен, взятый из широкой аренды перед отказом узкой корзины, вернулся
+    assert limiter.leases.held(wide.key) == 9
+
+def test_rate_limit_response_has_retry_after(client):
+    credentials = {"username": "nobody", "password": "password123"}
+    # Политика auth: 10 попыток входа в минуту с одного IP
+    for _ in range(10):
+        assert client.post("/users/login/", json=credentials).status_code == 401
+    response = client.post("/users/login/", json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.headers["X-RateLimit-Limit"] == "10"
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+
+@pytest.mark.asyncio
+async def test_app_error_does_not_rerun_app(monkeypatch):
+    calls = 0
+
+    async def app(scope, receive, send):
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("boom")
+
+    limiter = make_limiter(monkeypatch)
+    limiter.app = app
+    limiter.policies = []
+    with pytest.raises(RuntimeError):
+        await limiter({"type": "http", "method": "GET", "path": "/notes/"}, None, None)
+    assert calls == 1
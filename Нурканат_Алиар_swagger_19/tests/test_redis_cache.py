@@ -0,0 +1,151 @@
+import asyncio
+import time
+import fakeredis
+import pytest
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.redis_cache import RedisCache, LocalCache, default_key_builder, _should_refresh_early, STALE_AGE_HEADER
+
+@pytest.fixture
+def cache():
+    cache = RedisCache()
+    cache.redis = fakeredis.FakeAsyncRedis()
+    return cache
+
+class Owner:
+    def __init__(self, id):
+        self.id = id
+
+def test_key_builder_skips_injected_arguments():
+    def func():
+        pass
+    request = Request({"type": "http", "headers": []})
+    first = default_key_builder(func, {"session": AsyncSession(), "request": request, "current_user": Owner(1), "limit": 10})
+    second = default_key_builder(func, {"session": AsyncSession(), "request": request, "current_user": Owner(1), "limit": 10})
+    assert first == second
+    assert first != default_key_builder(func, {"current_user": Owner(2), "limit": 10})
+    assert first != default_key_builder(func, {"current_user": Owner(1), "limit": 20})
+
+@pytest.mark.asyncio
+async def test_invalidate_tags_drops_only_tagged_entries(cache):
+    calls = []
+
+    @cache.cache(key_prefix="notes", ttl=60, tags=["user:{owner_id}:notes"])
+    async def list_notes(owner_id: int):
+        calls.append(owner_id)
+        return [owner_id, len(calls)]
+
+    assert await list_notes(owner_id=1) == [1, 1]
+    assert await list_notes(owner_id=2) == [2, 2]
+    assert await list_notes(owner_id=1) == [1, 1]
+
+    await cache.invalidate_tags("user:1:notes")
+    assert await list_notes(owner_id=1) == [1, 3]
+    assert await list_notes(owner_id=2) == [2, 2]
+
+    await cache.invalidate("notes")
+    assert await list_notes(owner_id=2) == [2, 4]
+
+@pytest.mark.asyncio
+async def test_invalidated_keys_leave_prefix_set(cache):
+    @cache.cache(key_prefix="notes", ttl=60, tags=["user:{owner_id}:notes"])
+    async def list_notes(owner_id: int, page: int):
+        return owner_id
+
+    for owner_id in range(3):
+        await list_notes(owner_id=owner_id, page=0)
+    # Каждая страница - отдельный ключ, который затем сбрасывается
+    for page in range(1, 6):
+        await cache.invalidate_tags("user:1:notes")
+        await list_notes(owner_id=1, page=page)
+
+    # Набор префикса держит только живые записи, а не все когда-либо сброшенные
+    members = await cache.redis.smembers("cache:tag:notes")
+    assert len(members) == 3
+    assert [await cache.redis.exists(member) for member in members] == [1, 1, 1]
+
+@pytest.mark.asyncio
+async def test_tag_ttl_is_only_extended(cache):
+    async with cache.redis.pipeline(transaction=True) as pipe:
+        cache.tag_entry(pipe, "long", ["user:1:notes"], 90)
+        cache.tag_entry(pipe, "short", ["user:1:notes"], 30)
+        await pipe.execute()
+    assert await cache.redis.ttl("cache:tag:user:1:notes") == 90
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once(cache):
+    calls = 0
+
+    @cache.cache(key_prefix="slow", ttl=60)
+    async def slow(value: int):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return value
+
+    assert await asyncio.gather(*(slow(value=7) for _ in range(10))) == [7] * 10
+    assert calls == 1
+
+def test_early_refresh_probability():
+    now = time.time()
+    assert not _should_refresh_early((None, [], 1.0, now - 1), beta=0)
+    # Запись уже истекла - пересчет обязателен
+    assert _should_refresh_early((None, [], 0.001, now - 1), beta=1.0)
+    # Дешевый пересчет и час до истечения - досрочно не обновляем
+    assert not _should_refresh_early((None, [], 0.001, now + 3600), beta=1.0)
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing(cache):
+    version = 0
+
+    @cache.cache(key_prefix="feed", ttl=1, stale_ttl=30)
+    async def feed(response: Response):
+        nonlocal version
+        version += 1
+        return version
+
+    assert await feed(response=Response()) == 1
+    # Сдвигаем срок свежести в прошлое вместо ожидания
+    key = (await cache.redis.keys("feed:*"))[0].decode()
+    entry = cache.serializer.loads(await cache.redis.get(key))
+    await cache._store_entry(key, (*entry[:3], time.time() - 5), ["feed"], 30)
+
+    response = Response()
+    assert await feed(response=response) == 1
+    assert int(response.headers[STALE_AGE_HEADER]) >= 5
+    await asyncio.gather(*cache._background)
+    assert await feed(response=Response()) == 2
+
+@pytest.mark.asyncio
+async def test_local_entry_expires_with_redis_freshness():
+    server = fakeredis.FakeServer()
+    writer, reader = RedisCache(l1_size=10, l1_ttl=600), RedisCache(l1_size=10, l1_ttl=600)
+    writer.redis = fakeredis.FakeAsyncRedis(server=server)
+    reader.redis = fakeredis.FakeAsyncRedis(server=server)
+
+    async def feed():
+        return 1
+    for cache in (writer, reader):
+        await cache.cache(key_prefix="feed", ttl=2, stale_ttl=60)(feed)()
+        # Без ограничения L1 продержал бы запись l1_ttl, уже после ее устаревания в Redis
+        (expires_at, _, _), = cache.local._entries.values()
+        assert expires_at - time.monotonic() <= 2
+
+@pytest.mark.asyncio
+async def test_invalidate_survives_redis_outage():
+    server = fakeredis.FakeServer()
+    cache = RedisCache(l1_size=10)
+    cache.redis = fakeredis.FakeAsyncRedis(server=server)
+    cache.local.set("notes:key", "value", tags=["user:1:notes"])
+    server.connected = False
+
+    await cache.invalidate_tags("user:1:notes", key_prefix="notes")
+    assert len(cache.local) == 0
+
+def test_local_cache_tag_invalidation():
+    local = LocalCache(maxsize=10, ttl=60)
+    local.set("a", 1, tags=["user:1:notes"])
+    local.set("b", 2, tags=["user:2:notes"])
+    local.invalidate_tags(["user:1:notes"])
+    assert len(local) == 1
+    assert local.get("b") == 2
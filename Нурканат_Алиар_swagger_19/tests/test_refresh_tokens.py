@@ -0,0 +1,40 @@
+import time
+from jose import jwt
+from config.settings import settings
+
+def login(client):
+    response = client.post("/users/login/", json={"username": "testuser", "password": "testpass"})
+    assert response.status_code == 200
+    return response.json()
+
+def refresh(client, refresh_token):
+    return client.post("/users/refresh/", json={"refresh_token": refresh_token})
+
+def test_refresh_rotates_token(client, test_user):
+    tokens = login(client)
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+
+    headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert client.get("/users/me/", headers=headers).status_code == 200
+    # Срок считается от выдачи токена, а не от запуска процесса
+    claims = jwt.get_unverified_claims(rotated["access_token"])
+    assert abs(claims["exp"] - (time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)) < 60
+
+def test_reused_refresh_token_revokes_family(client, test_user):
+    tokens = login(client)
+    rotated = refresh(client, tokens["refresh_token"]).json()
+
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    # Повторное использование отзывает всю цепочку, включая последний токен
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+
+def test_refresh_rejected_after_logout(client, test_user):
+    tokens = login(client)
+    client.post("/users/logout/", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+def test_malformed_refresh_token(client):
+    assert refresh(client, "not-a-token").status_code == 401
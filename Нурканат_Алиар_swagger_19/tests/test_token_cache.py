@@ -0,0 +1,24 @@
+import time
+from config.token_cache import TokenCache
+
+def test_token_cache_hit_and_invalidate():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.set("token-1", "testuser", "user-object")
+    assert cache.get("token-1") == "user-object"
+    cache.invalidate_subject("testuser")
+    assert cache.get("token-1") is None
+
+def test_token_cache_respects_token_exp():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.set("expired", "testuser", "user-object", exp=time.time() - 1)
+    assert cache.get("expired") is None
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache(maxsize=2, ttl=60)
+    cache.set("a", "alice", 1)
+    cache.set("b", "bob", 2)
+    cache.get("a")
+    cache.set("c", "carol", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
@@ -0,0 +1,54 @@
+import fakeredis
+import pytest
+from sqlmodel import select
+from config.token_versions import TokenVersionStore
+from models import User
+
+def login(client, credentials):
+    response = client.post("/users/login/", json=credentials)
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_logout_revokes_all_tokens(client, test_user):
+    credentials = {"username": "testuser", "password": "testpass"}
+    first, second = login(client, credentials), login(client, credentials)
+    assert client.get("/users/me/", headers=second).status_code == 200
+
+    assert client.post("/users/logout/", headers=first).status_code == 200
+    assert client.get("/users/me/", headers=first).status_code == 401
+    assert client.get("/users/me/", headers=second).status_code == 401
+    assert client.get("/users/me/", headers=login(client, credentials)).status_code == 200
+
+def test_role_change_revokes_tokens(client, test_user, session_factory):
+    headers = login(client, {"username": "testuser", "password": "testpass"})
+
+    async def promote():
+        async with session_factory() as session:
+            user = (await session.execute(select(User).where(User.username == "testuser"))).scalar_one()
+            user.role = "admin"
+            await session.commit()
+
+    client.portal.call(promote)
+    assert client.get("/users/me/", headers=headers).status_code == 401
+
+@pytest.mark.asyncio
+async def test_sync_never_lowers_local_version():
+    server = fakeredis.FakeServer()
+    store = TokenVersionStore()
+    store.redis = fakeredis.FakeAsyncRedis(server=server)
+
+    server.connected = False
+    await store.bump(1, 3)
+    server.connected = True
+    await store.sync()
+    assert not store.is_current(1, 2)
+
+@pytest.mark.asyncio
+async def test_load_restores_lost_versions():
+    store = TokenVersionStore()
+    store.redis = fakeredis.FakeAsyncRedis()
+    await store.redis.hset(store.key, "1", 1)
+
+    await store.load({1: 2, 2: 5})
+    assert not store.is_current(1, 1)
+    assert await store.redis.hgetall(store.key) == {b"1": b"2", b"2": b"5"}
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import update
 from sqlmodel import select
 from metadata import SessionDep
-from models import User, UserCreate, UserOut, UserLogin, get_current_user, hash_password, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, timedelta, Token
+from redis.exceptions import RedisError
+from models import User, UserCreate, UserOut, UserLogin, get_current_user, hash_password_async, verify_password_async, create_user_access_token, user_from_claims, ACCESS_TOKEN_EXPIRE_MINUTES, timedelta, Token, RefreshRequest
+from config.token_cache import token_cache
+from config.token_versions import token_versions
+from config.refresh_tokens import refresh_tokens, RefreshTokenError
 from tests.tasks import send_email_task
 
 router = APIRouter(
@@ -69,7 +74,7 @@ async def register(user: UserCreate, session: SessionDep):
     db_user = await session.execute(select(User).where(User.username == user.username))
     if db_user.scalars().first():
         raise HTTPException(status_code=400, detail="Username already registered")
-    new_user = User(username=user.username, password=hash_password(user.password))
+    new_user = User(username=user.username, password=await hash_password_async(user.password))
     session.add(new_user)
     await session.commit()
     await session.refresh(new_user)
@@ -90,7 +95,7 @@ async def register(user: UserCreate, session: SessionDep):
     Процесс:
     1. Проверка существования пользователя
     2. Верификация пароля
-    3. Создание JWT токена
+    3. Создание JWT токена и refresh-токена
     
     Использование токена:
     Добавьте полученный токен в заголовок: `Authorization: Bearer <token>`
@@ -102,7 +107,8 @@ async def register(user: UserCreate, session: SessionDep):
                 "application/json": {
                     "example": {
                         "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
-                        "token_type": "bearer"
+                        "token_type": "bearer",
+                        "refresh_token": "q3Vt9xk2Lr0aYp1n.Xb8c..."
                     }
                 }
             }
@@ -114,17 +120,138 @@ async def register(user: UserCreate, session: SessionDep):
                     "example": {"detail": "Invalid credentials"}
                 }
             }
+        },
+        503: {
+            "description": "Сервис аутентификации перегружен",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Authentication service is busy. Try again later."}
+                }
+            }
         }
     }
 )
 async def login(credentials: UserLogin, session: SessionDep):
     user = await session.execute(select(User).where(User.username == credentials.username))
     user = user.scalars().first()
-    if not user or not verify_password(credentials.password, user.password):
+    if not user or not await verify_password_async(credentials.password, user.password):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer"}
+    access_token = create_user_access_token(user, expires_delta=access_token_expires)
+    try:
+        refresh_token = await refresh_tokens.issue(user.id, user.username, user.role, user.token_version)
+    except (RedisError, RuntimeError):
+        refresh_token = None
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post(
+    "/refresh/",
+    response_model=Token,
+    summary="Обновление токена доступа",
+    description="""
+    Выдает новый токен доступа по refresh-токену без повторной проверки пароля.
+    
+    Особенности:
+    - Refresh-токен одноразовый: в ответе возвращается новый
+    - Повторное использование старого refresh-токена отзывает всю цепочку
+    - После выхода из системы или смены роли требуется повторный вход
+    """,
+    responses={
+        200: {
+            "description": "Новая пара токенов",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
+                        "token_type": "bearer",
+                        "refresh_token": "q3Vt9xk2Lr0aYp1n.Xb8c..."
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Refresh-токен недействителен, истек или отозван",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid refresh token"}
+                }
+            }
+        },
+        503: {
+            "description": "Хранилище refresh-токенов недоступно",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Token service unavailable"}
+                }
+            }
+        }
+    }
+)
+async def refresh(payload: RefreshRequest):
+    """Ротация refresh-токена и выдача нового токена доступа"""
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        refresh_token, claims = await refresh_tokens.rotate(payload.refresh_token)
+    except RefreshTokenError:
+        raise invalid_token
+    except (RedisError, RuntimeError):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token service unavailable")
+    if not token_versions.is_current(claims["uid"], claims["ver"]):
+        await refresh_tokens.revoke(refresh_token)
+        raise invalid_token
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_user_access_token(user_from_claims(claims), expires_delta=access_token_expires)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post(
+    "/logout/",
+    summary="Выход из системы",
+    description="""
+    Отзывает все выданные токены текущего пользователя.
+    
+    Процесс:
+    1. Увеличение версии токенов пользователя
+    2. Публикация новой версии в Redis для всех воркеров
+    
+    Ранее выданные токены перестают приниматься в течение нескольких секунд.
+    """,
+    responses={
+        200: {
+            "description": "Токены пользователя отозваны",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Logged out"}
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def logout(session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Отзыв всех токенов текущего пользователя"""
+    stmt = (
+        update(User)
+        .where(User.id == current_user.id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    )
+    result = await session.execute(stmt)
+    version = result.scalar_one()
+    await session.commit()
+    token_cache.invalidate_subject(current_user.username)
+    await token_versions.bump(current_user.id, version)
+    return {"detail": "Logged out"}
 
 @router.get(
     "/me", 
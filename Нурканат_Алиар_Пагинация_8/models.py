@@ -1,4 +1,4 @@
-from sqlalchemy import select
+from sqlalchemy import select, Index
 from sqlmodel import SQLModel, Field, Relationship
 from pydantic import BaseModel
 from typing import Optional,  List
@@ -30,6 +30,9 @@ class User(SQLModel, table=True):
     notes: List["Note"] = Relationship(back_populates="owner")
 
 class Note(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_note_owner_id_id", "owner_id", "id"),
+    )
     id: Optional[int] = Field(primary_key=True, default=None)
     title: str = Field(max_length=100)
     content: str = Field(max_length=1000)
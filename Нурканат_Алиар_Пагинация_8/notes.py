@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import base64
+import binascii
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import select
 from metadata import SessionDep
 from models import Note, NoteCreate, NoteOut, NoteUpdate, User, get_current_user
@@ -8,6 +11,22 @@ router = APIRouter(
     tags=["notes"]
 )
 
+def encode_cursor(note_id: int) -> str:
+    return base64.urlsafe_b64encode(str(note_id).encode()).decode().rstrip("=")
+
+# note.id - INTEGER (SERIAL): больший ID в курсоре драйвер БД не примет
+MAX_CURSOR_ID = 2 ** 31 - 1
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        note_id = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not 0 <= note_id <= MAX_CURSOR_ID:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return note_id
+
 @router.post("/", response_model=NoteOut)
 async def create_note(note: NoteCreate, session: SessionDep, current_user: User = Depends(get_current_user)):
     new_note = Note(title=note.title, content=note.content, owner_id=current_user.id)
@@ -19,10 +38,12 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
 @router.get("/", response_model=list[NoteOut])
 async def list_notes(
     session: SessionDep, 
+    response: Response,
     current_user: User = Depends(get_current_user), 
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, le=100),
-    search: str = Query(None)
+    limit: int = Query(10, ge=1, le=100),
+    search: str = Query(None),
+    cursor: Optional[str] = Query(None)
     ):
 
     stmt = select(Note).where(Note.owner_id == current_user.id)
@@ -31,9 +52,16 @@ async def list_notes(
         stmt = stmt.where(
             (Note.title.ilike(search_term)) | (Note.content.ilike(search_term))
         )
-    stmt = stmt.offset(skip).limit(limit)
+    stmt = stmt.order_by(Note.owner_id, Note.id)
+    if cursor:
+        stmt = stmt.where(Note.id > decode_cursor(cursor))
+    else:
+        stmt = stmt.offset(skip)
+    stmt = stmt.limit(limit)
     result = await session.execute(stmt)
     notes = result.scalars().all()
+    if len(notes) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(notes[-1].id)
     return notes
 
 @router.get("/{note_id}", response_model=NoteOut)